@@ -0,0 +1,275 @@
+"""
+Benchmark the rating pipeline on synthetic data and the page parser on pages.
+
+Each size in --rows runs in a fresh process: a synthetic fighter_matches.csv of
+that many rows is written (synthetic_data.py), read into a MatchStore (from
+the CSV, then through its binary cache, match_cache.py), rated from scratch,
+checkpointed and exported by every sink, all in a temporary directory.
+
+The parser is timed on the pages under --pages, by default the pages in
+synthetic_pages/: scraped rows of a few real fighters re-rendered by
+synthetic_data.py, not markup recorded from the site. Pass a crawler
+page_cache/ directory to time it on real pages.
+
+Every stage reports its time, its throughput and the peak RSS of the process
+once it has finished, so a stage that grows memory shows up as a jump. With
+--baseline the results are compared against a saved run, and stages slower
+(or peaking higher) than the baseline by more than --tolerance are reported as
+regressions and make the exit status 1. Baselines are machine specific:
+
+    python benchmark.py --rows 41000 1000000 --repeat 3 --save-baseline
+    python benchmark.py --rows 41000 1000000 --repeat 3
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import sys
+import tempfile
+import time
+from elo_engine import EloEngine
+from elo_sinks import EloRatingsCsvSink, RatingHistoryCsvSink, RatingHistoryBinarySink, TopByYearCsvSink
+from fighter_names import fighter_key
+from match_cache import build_cache, load_match_store
+from match_store import read_match_store
+from match_table_parser import iter_saved_pages, parse_fighter_page_fast
+from synthetic_data import write_matches_csv
+
+PAGES_DIR = 'synthetic_pages'
+RESULTS_FILE = 'bench_results.json'
+BASELINE_FILE = 'bench_baseline.json'
+# Allowed slowdown (or memory growth) against the baseline before a stage counts as a regression
+TOLERANCE = 0.25
+# Stages shorter than this are too noisy to compare
+MIN_SECONDS = 0.05
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+class Stages:
+    """Time, item count and peak memory of each pipeline stage, in order"""
+
+    def __init__(self):
+        self.results = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, unit='rows'):
+        result = {'unit': unit, 'items': 0}
+        start = time.perf_counter()
+        yield result
+        seconds = time.perf_counter() - start
+        result['seconds'] = round(seconds, 4)
+        result['rate'] = round(result['items'] / seconds, 1) if seconds > 0 else None
+        result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        self.results[name] = result
+
+def bench_pipeline(rows, seed=0):
+    """Stage results for one synthetic data size"""
+    stages = Stages()
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        filename = os.path.join(directory, 'fighter_matches.csv')
+        with stages.stage('generate') as result:
+            result['items'] = write_matches_csv(filename, rows, seed)
+        size = os.path.getsize(filename)
+
+        with stages.stage('ingest') as result:
+            store = read_match_store(filename)
+            matches = list(store)
+            result['items'] = rows
+        result['mb_per_s'] = round(size / 2 ** 20 / result['seconds'], 1)
+
+        with stages.stage('cache_build') as result:
+            build_cache(filename)
+            result['items'] = rows
+        with stages.stage('ingest_cached') as result:
+            store = load_match_store(filename)
+            matches = list(store)
+            result['items'] = rows
+        result['mb_per_s'] = round(size / 2 ** 20 / result['seconds'], 1)
+
+        # The engine caches fighter keys, so time them cold on their own first
+        with stages.stage('names', unit='names') as result:
+            fighter_key.cache_clear()
+            for match in matches:
+                fighter_key(match['Fighter_Name'])
+                fighter_key(match['Opponent'])
+            result['items'] = 2 * len(matches)
+        fighter_key.cache_clear()
+
+        engine = EloEngine()
+        with stages.stage('rate', unit='bouts') as result:
+            engine.update(matches)
+            result['items'] = engine.rows_processed
+
+        with stages.stage('checkpoint', unit='bouts') as result:
+            engine.save_checkpoint(os.path.join(directory, 'elo_state.json'))
+            result['items'] = engine.rows_processed
+
+        sinks = [
+            ('export_ratings', EloRatingsCsvSink(os.path.join(directory, 'elo_ratings.csv')), len(engine.names), 'fighters'),
+            ('export_history', RatingHistoryCsvSink(os.path.join(directory, 'rating_history.csv')), len(engine.rating_history), 'rows'),
+            ('export_history_bin', RatingHistoryBinarySink(os.path.join(directory, 'rating_history.bin')), len(engine.rating_history), 'rows'),
+            ('export_top_by_year', TopByYearCsvSink(os.path.join(directory, 'top3_by_year.csv')), len(engine.year_end.years()), 'years'),
+        ]
+        for name, sink, items, unit in sinks:
+            with stages.stage(name, unit) as result:
+                engine.export([sink])
+                result['items'] = items
+    return stages.results
+
+def bench_parser(pages, repeat, use_bs4=False):
+    """Stage results for parsing every page `repeat` times"""
+    stages = Stages()
+    parsers = [('parse_fast', parse_fighter_page_fast)]
+    if use_bs4:
+        from sitemap_scraper import parse_fighter_page_bs4
+        parsers.append(('parse_bs4', parse_fighter_page_bs4))
+    size = sum(len(html.encode('utf-8')) for _, html in pages)
+    for name, parse in parsers:
+        with stages.stage(name, unit='pages') as result:
+            for _ in range(repeat):
+                for url, html in pages:
+                    parse(html, url)
+            result['items'] = repeat * len(pages)
+        result['mb_per_s'] = round(repeat * size / 2 ** 20 / result['seconds'], 1)
+    return stages.results
+
+def _child(results, job, *args):
+    results.put(job(*args))
+
+def run_isolated(job, *args):
+    """
+    Run a benchmark job in a new process so its peak memory is its own.
+    Returns its results, or an error dict if the process died (e.g. killed when out of memory).
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_child, args=(results, job) + args)
+    process.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive() and results.empty():
+                    return {'error': f"benchmark process exited with status {process.exitcode}"}
+    finally:
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+
+def best_of(runs):
+    """Fastest time of each stage over repeated runs of one job; any failed run fails the job"""
+    for results in runs:
+        if 'error' in results:
+            return results
+    best = runs[0]
+    for results in runs[1:]:
+        for name, stage in results.items():
+            if stage['seconds'] < best[name]['seconds']:
+                best[name] = stage
+    return best
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regression messages for stages slower or larger than in the baseline"""
+    regressions = []
+    for group, stages in results['runs'].items():
+        old_stages = baseline.get('runs', {}).get(group)
+        if not old_stages or 'error' in old_stages:
+            continue
+        if 'error' in stages:
+            regressions.append(f"{group}: {stages['error']}")
+            continue
+        for name, stage in stages.items():
+            old = old_stages.get(name)
+            if not old:
+                continue
+            if max(stage['seconds'], old['seconds']) >= MIN_SECONDS and stage['seconds'] > old['seconds'] * (1 + tolerance):
+                regressions.append(f"{group} {name}: {stage['seconds']:.3f}s vs {old['seconds']:.3f}s in the baseline")
+            if stage['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+                regressions.append(f"{group} {name}: peak RSS {stage['peak_rss_mb']:.0f} MB vs {old['peak_rss_mb']:.0f} MB in the baseline")
+    return regressions
+
+def print_results(results, baseline=None):
+    old_runs = (baseline or {}).get('runs', {})
+    for group, stages in results['runs'].items():
+        print(f"{group}:")
+        if 'error' in stages:
+            print(f"  {stages['error']}")
+            continue
+        for name, stage in stages.items():
+            line = f"  {name:20} {stage['seconds']:9.3f}s"
+            if stage['rate'] is not None:
+                line += f" {stage['rate']:12,.0f} {stage['unit']}/s"
+            if 'mb_per_s' in stage:
+                line += f" {stage['mb_per_s']:7.1f} MB/s"
+            line += f"   peak RSS {stage['peak_rss_mb']:8.1f} MB"
+            old = old_runs.get(group, {}).get(name)
+            if old and old['seconds'] > 0:
+                line += f"   {stage['seconds'] / old['seconds']:5.2f}x baseline time"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rating pipeline and the page parser')
+    parser.add_argument('--rows', type=int, nargs='+', default=[41000],
+                        help='synthetic data sizes in rows (default: %(default)s, about the scraped data)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pages', default=PAGES_DIR, help='fighter pages to parse (default: %(default)s)')
+    parser.add_argument('--page-repeat', type=int, default=20, help='times to parse each page (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='run each benchmark this many times and keep the fastest of each stage (default: %(default)s)')
+    parser.add_argument('--bs4', action='store_true', help='also time the BeautifulSoup parser')
+    parser.add_argument('--out', default=RESULTS_FILE, help='results file (default: %(default)s)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='results to compare against (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed slowdown against the baseline, as a fraction (default: %(default)s)')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'runs': {},
+    }
+    for rows in args.rows:
+        print(f"Benchmarking the pipeline on {rows} synthetic rows...")
+        runs = [run_isolated(bench_pipeline, rows, args.seed) for _ in range(args.repeat)]
+        results['runs'][f"pipeline {rows}"] = best_of(runs)
+    pages = list(iter_saved_pages(args.pages)) if os.path.exists(args.pages) else []
+    if pages:
+        print(f"Benchmarking the parser on {len(pages)} pages...")
+        runs = [run_isolated(bench_parser, pages, args.page_repeat, args.bs4) for _ in range(args.repeat)]
+        results['runs'][f"parser {len(pages)} pages"] = best_of(runs)
+    else:
+        print(f"No pages found under {args.pages}, skipping the parser")
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    out = args.baseline if args.save_baseline else args.out
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+What-if recomputation for corrected, inserted or removed bouts.
+
+A bout's outcome only depends on the two fighters' states going into it, so a
+change can only reach fighters linked to it by later bouts. what_if() starts
+at the earliest changed bout and follows the affected fighters forward, bout
+by bout, through their later bouts in the rating history. Each newly reached
+opponent is seeded with their original state just before that bout, and only
+the reached bouts are re-rated, in a scratch engine. The work is proportional
+to the number of affected bouts rather than the whole history (plus indexing
+the history by fighter, which is done once and then extended as bouts are
+rated; see RatingHistory.fighter_rows()).
+
+The engine itself is not modified: the result is a list of RatingChange
+entries, the biggest moves first. Persist a correction by fixing
+fighter_matches.csv and running elo_calculator.py.
+
+    python counterfactual.py --flip 41234 --remove 40001 --set 38000 Stage=F --verify
+"""
+import argparse
+import heapq
+import sys
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from elo_engine import EloEngine, match_key
+from fighter_names import display_name, fighter_key
+from match_cache import load_match_store
+from match_store import MIRRORED_RESULT, normalized_result
+from metrics import METRICS
+
+RatingChange = namedtuple('RatingChange', 'fighter old_rating new_rating old_matches new_matches')
+
+def _bout_row(row):
+    return dict(row, Year=int(row['Year']), ID=int(row['ID']))
+
+def history_index(engine):
+    """({fighter ID: their history rows, oldest first}, {match ID: position in processed}), cached per engine state"""
+    cached = engine._what_if_index
+    if cached is not None and cached[0] == engine.rows_processed:
+        return cached[1], cached[2]
+    fighter_rows = engine.rating_history.fighter_rows()
+    positions = {match['ID']: i for i, match in enumerate(engine.processed)}
+    engine._what_if_index = (engine.rows_processed, fighter_rows, positions)
+    return fighter_rows, positions
+
+def what_if(engine, edited=(), inserted=(), removed=()):
+    """
+    Ratings changes if the edited rows replaced the bouts with their IDs, the inserted
+    rows were added and the bouts with the removed IDs were dropped. Returns
+    RatingChange tuples for every fighter whose current rating or bout count moves.
+    """
+    if len(engine.processed) != engine.rows_processed:
+        raise ValueError("The processed rows are unknown after restore(); call update() with all matches first")
+    if engine.system.fields:
+        # The rating history only records ratings, not e.g. Glicko-2 deviations before a bout
+        raise ValueError(f"what_if() needs a rating system whose state is the rating alone, not {engine.system.name}")
+    fighter_rows, positions = history_index(engine)
+    processed = engine.processed
+    history = engine.rating_history
+    years, match_ids, ratings = history.years, history.match_ids, history.ratings
+
+    def row_key(row):
+        return (years[row], match_ids[row])
+
+    # Original bouts that no longer exist as they were, and the rows that take their place
+    events = []
+    gone = set()
+    new_rows = []
+    for row in edited:
+        row = _bout_row(row)
+        if row['ID'] not in positions:
+            raise ValueError(f"No bout with ID {row['ID']} to edit")
+        new_rows.append(row)
+    for row in inserted:
+        row = _bout_row(row)
+        if row['ID'] in positions:
+            raise ValueError(f"Bout {row['ID']} already exists; edit it instead")
+        new_rows.append(row)
+    replaced = [row['ID'] for row in new_rows if row['ID'] in positions]
+    for match_id in dict.fromkeys(replaced + [int(match_id) for match_id in removed]):
+        if match_id not in positions:
+            raise ValueError(f"No bout with ID {match_id} to remove")
+        old = processed[positions[match_id]]
+        gone.add(match_key(old))
+        # Kind 0 sorts first: the old bout's fighters leave the original timeline here
+        events.append((match_key(old), 0, positions[match_id], old))
+    for i, row in enumerate(new_rows):
+        events.append((match_key(row), 1, -1 - i, row))
+    heapq.heapify(events)
+
+    scratch = EloEngine(engine.initial_rating, engine.k_new, engine.k_established, engine.provisional_matches,
+                        rules=engine.rules, checkpoint_every=None, decay_rate=engine.decay_rate,
+                        decay_grace=engine.decay_grace, system=engine.system)
+    original_ids = {}  # Scratch fighter ID -> original fighter ID (None for fighters new to the data)
+
+    def follow(fighter, key):
+        """Queue an affected fighter's next original bout after key"""
+        rows = fighter_rows.get(fighter, ())
+        j = bisect_right(rows, key, key=row_key)
+        while j < len(rows) and row_key(rows[j]) in gone:
+            j += 1
+        if j < len(rows):
+            bout_key = row_key(rows[j])
+            heapq.heappush(events, (bout_key, 1, positions[bout_key[1]], None))
+
+    def seed(raw_name, key):
+        """Add a fighter to the scratch engine with their original state just before key"""
+        name_key = fighter_key(raw_name)
+        fighter = scratch.fighter_ids.get(name_key)
+        if fighter is not None:
+            return fighter
+        original = engine.fighter_ids.get(name_key)
+        fighter = scratch._add_fighter(name_key, engine.names[original] if original is not None else display_name(raw_name))
+        original_ids[fighter] = original
+        rows = fighter_rows.get(original, ())
+        earlier = bisect_left(rows, key, key=row_key)
+        if earlier:
+            last = rows[earlier - 1]
+            scratch.ratings[fighter] = ratings[last]
+            scratch.match_counts[fighter] = earlier
+            scratch.last_years[fighter] = years[last]
+            for row in rows[:earlier]:
+                if ratings[row] > scratch.peak_ratings[fighter]:
+                    scratch.peak_ratings[fighter] = ratings[row]
+                    scratch.peak_years[fighter] = years[row]
+        return fighter
+
+    done = set()
+    while events:
+        key, kind, position, match = heapq.heappop(events)
+        if kind == 1:
+            if key in done:
+                continue
+            done.add(key)
+            if match is None:
+                match = processed[position]
+        names = (match['Fighter_Name'], match['Opponent'])
+        for name in names:
+            seed(name, key)
+        if kind == 1:
+            scratch.process(match)
+        for name in names:
+            original = original_ids[scratch.fighter_ids[fighter_key(name)]]
+            if original is not None:
+                follow(original, key)
+    METRICS.inc('what_if_bouts_recomputed', len(done))
+
+    # Compare at the same point in time, which matters with inactivity decay
+    year = max([engine.last_key[0]] + [row['Year'] for row in new_rows]) if engine.last_key else None
+    changes = []
+    for fighter, original in original_ids.items():
+        old_rating = engine.current_rating(original, year) if original is not None else None
+        old_matches = engine.match_counts[original] if original is not None else 0
+        new_rating = scratch.current_rating(fighter, year)
+        new_matches = scratch.match_counts[fighter]
+        if old_rating != new_rating or old_matches != new_matches:
+            changes.append(RatingChange(scratch.names[fighter], old_rating, new_rating, old_matches, new_matches))
+    changes.sort(key=lambda change: -abs(change.new_rating - (change.old_rating if change.old_rating is not None else engine.initial_rating)))
+    return changes
+
+def apply_changes(matches, edited=(), inserted=(), removed=()):
+    """The match list with the same changes applied, for a full recompute"""
+    replaced = {row['ID']: row for row in map(_bout_row, edited)}
+    removed = {int(match_id) for match_id in removed}
+    result = [replaced.get(match['ID'], match) for match in matches if match['ID'] not in removed]
+    return result + [_bout_row(row) for row in inserted]
+
+def parse_set(values):
+    """{ID: {column: value}} from ID COLUMN=VALUE pairs"""
+    changes = {}
+    for match_id, assignment in values:
+        column, _, value = assignment.partition('=')
+        changes.setdefault(int(match_id), {})[column] = value
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description='Show how ratings would change if some bouts were corrected or removed')
+    parser.add_argument('--flip', type=int, nargs='+', default=[], metavar='ID', help='bouts whose winner should be swapped')
+    parser.add_argument('--set', nargs=2, action='append', default=[], metavar=('ID', 'COLUMN=VALUE'),
+                        help='correct one column of a bout, e.g. --set 41234 Stage=F')
+    parser.add_argument('--remove', type=int, nargs='+', default=[], metavar='ID', help='bouts to drop')
+    parser.add_argument('--matches', default='fighter_matches.csv')
+    parser.add_argument('--top', type=int, default=20, help='changes to list (default: %(default)s)')
+    parser.add_argument('--verify', action='store_true', help='also recompute everything and compare')
+    args = parser.parse_args()
+
+    matches = list(load_match_store(args.matches))
+    by_id = {match['ID']: match for match in matches}
+    changed = parse_set(args.set)
+    unknown = sorted({*args.flip, *changed, *args.remove} - by_id.keys())
+    if unknown:
+        parser.error(f"bout IDs not in {args.matches}: {', '.join(map(str, unknown))}")
+
+    engine = EloEngine()
+    engine.update(matches)
+    edits = {}
+    for match_id in args.flip:
+        row = by_id[match_id]
+        edits[match_id] = dict(row, **{'W/L': MIRRORED_RESULT.get(normalized_result(row), row['W/L'])})
+    for match_id, columns in changed.items():
+        edits[match_id] = dict(edits.get(match_id, by_id[match_id]), **columns)
+
+    changes = what_if(engine, edited=edits.values(), removed=args.remove)
+    print(f"{len(changes)} fighters affected")
+    for change in changes[:args.top]:
+        old = f"{change.old_rating:.2f}" if change.old_rating is not None else 'unrated'
+        print(f"  {change.fighter}: {old} -> {change.new_rating:.2f} ({change.old_matches} -> {change.new_matches} bouts)")
+
+    if args.verify:
+        full = EloEngine()
+        full.update(apply_changes(matches, edits.values(), removed=args.remove))
+        got = {change.fighter: change.new_rating for change in changes}
+        mismatched = [name for fighter, name in enumerate(full.names)
+                      if got.get(name, engine.rating(name)) != full.current_rating(fighter)]
+        same = not mismatched
+        print("Matches a full recompute" if same else "Differs from a full recompute")
+        return 0 if same else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
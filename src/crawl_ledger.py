@@ -0,0 +1,112 @@
+"""
+Persistent work ledger for the fighter crawl.
+
+A SQLite file holds one row per fighter URL from the sitemap with its crawl
+status ('pending', 'done' or 'failed') and, once done, the parsed fighter data.
+Each result is committed as it arrives, so a crawl that dies midway can be
+restarted and only the pending and failed fighters are fetched again. The run
+is marked complete once fighter_matches.csv has been exported from it.
+"""
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS fighters (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reason TEXT,
+    parsed TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS fighters_status ON fighters (status);
+"""
+
+class CrawlLedger:
+    def __init__(self, filename='crawl_ledger.sqlite'):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        # WAL with synchronous=NORMAL keeps a commit per fighter cheap but durable across crashes
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def _get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def unfinished(self):
+        """True if the last crawl stopped before its export"""
+        return self._get_meta('state') == 'crawling'
+
+    def start(self, fighter_urls):
+        """Begin a new crawl of fighter_urls (a list, or a dict mapping URL to sitemap <lastmod>)"""
+        lastmods = fighter_urls if isinstance(fighter_urls, dict) else dict.fromkeys(fighter_urls)
+        with self.db:
+            self.db.execute('DELETE FROM fighters')
+            self.db.executemany('INSERT INTO fighters (url, lastmod) VALUES (?, ?)', lastmods.items())
+            self._set_meta('state', 'crawling')
+            self._set_meta('started_at', str(time.time()))
+
+    def requeue(self, fighter_urls):
+        """Mark fighters as pending again, e.g. the ones in the failure report"""
+        with self.db:
+            for fighter_url in fighter_urls:
+                self.db.execute("INSERT INTO fighters (url) VALUES (?) "
+                                "ON CONFLICT (url) DO UPDATE SET status = 'pending'", (fighter_url,))
+            self._set_meta('state', 'crawling')
+
+    def pending(self):
+        """{fighter_url: lastmod} for every fighter still to crawl"""
+        rows = self.db.execute("SELECT url, lastmod FROM fighters WHERE status != 'done' ORDER BY rowid")
+        return dict(rows)
+
+    def record_done(self, fighter_url, fighter_data):
+        """Store a fighter's parsed data (None for a page without matches)"""
+        parsed = json.dumps(fighter_data) if fighter_data else None
+        with self.db:
+            self.db.execute("UPDATE fighters SET status = 'done', reason = NULL, parsed = ?, updated_at = ? WHERE url = ?",
+                            (parsed, time.time(), fighter_url))
+
+    def record_failed(self, fighter_url, attempts, reason):
+        with self.db:
+            self.db.execute("UPDATE fighters SET status = 'failed', attempts = attempts + ?, reason = ?, updated_at = ? WHERE url = ?",
+                            (attempts, reason, time.time(), fighter_url))
+
+    def counts(self):
+        """Number of fighters per status"""
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM fighters GROUP BY status'))
+
+    def failures(self):
+        """(fighter_url, attempts, reason) for every fighter whose last attempt failed"""
+        rows = self.db.execute("SELECT url, attempts, reason FROM fighters WHERE status = 'failed' ORDER BY rowid")
+        return rows.fetchall()
+
+    def iter_fighters(self):
+        """Parsed data of every finished fighter with matches, in crawl-list order"""
+        rows = self.db.execute("SELECT parsed FROM fighters WHERE status = 'done' AND parsed IS NOT NULL ORDER BY rowid")
+        for (parsed,) in rows:
+            yield json.loads(parsed)
+
+    def finish(self):
+        """Mark the crawl complete, so the next run starts from the sitemap again"""
+        with self.db:
+            self._set_meta('state', 'complete')
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
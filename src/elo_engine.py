@@ -0,0 +1,673 @@
+import hashlib
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from fighter_names import display_name, fighter_key, aliases_fingerprint
+from history_store import RatingHistory
+from multiplier_rules import load_rules
+from leaderboards import LiveLeaderboard, YearEndLeaderboards
+from metrics import METRICS
+
+# Elo parameters
+INITIAL_RATING = 1500
+K_NEW = 32  # K-factor for new fighters
+K_ESTABLISHED = 16  # K-factor for established fighters
+PROVISIONAL_MATCHES = 10  # Number of matches before a fighter is considered established
+
+# Method, competition and stage multipliers, see multiplier_rules.json
+DEFAULT_RULES = load_rules()
+# Winner's multiplier by win method class
+METHOD_MULTIPLIERS = DEFAULT_RULES.method_multipliers
+# Winner's multiplier by competition keyword (lowercase), first match wins
+EVENT_MULTIPLIERS = DEFAULT_RULES.event_multipliers
+
+CHECKPOINT_VERSION = 11
+# Idle years before inactivity decay starts, when decay is on
+DECAY_GRACE = 1
+# Default spacing of the in-memory checkpoints used by as_of(): 'year' or a number of bouts
+CHECKPOINT_EVERY = 'year'
+
+# Match columns that decide a bout's rating, normalized as process() reads them; a checkpoint
+# keeps a digest of them so update() notices bouts corrected after they were rated
+DIGEST_COLUMNS = {
+    'Fighter_Name': str,
+    'Opponent': str,
+    'W/L': lambda value: value.strip().upper(),
+    'Method': lambda value: value.strip().lower(),
+    'Competition': lambda value: value.strip().lower(),
+    'Stage': lambda value: value.strip().upper(),
+}
+
+def match_key(match):
+    return (match['Year'], match['ID'])
+
+def expected_score(rating_f, rating_o):
+    """Elo probability that a fighter beats an opponent; works on floats and NumPy arrays alike"""
+    return 1 / (1 + 10 ** ((rating_o - rating_f) / 400))
+
+def elo_changes(expected_f, k_f, k_o, actual, method_multiplier, event_multiplier, stage_multiplier):
+    """
+    The Elo update, shared by the engine, the vectorized EloSystem and the sweep:
+    rating changes (fighter, opponent) for bouts with the fighter's expected and
+    actual score. The method and event multipliers (1.0 unless the fighter won)
+    scale the fighter's change only, the stage multiplier both.
+    """
+    change_f = k_f * (actual - expected_f) * method_multiplier * event_multiplier * stage_multiplier
+    change_o = k_o * ((1 - actual) - (1 - expected_f)) * stage_multiplier
+    return change_f, change_o
+
+def history_filename(checkpoint_filename):
+    return checkpoint_filename + '.history'
+
+def history_digest(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def digest_matches(hasher, matches, columns=DIGEST_COLUMNS):
+    """Feed the key and digest columns of each match, in the order given, to a hashlib object"""
+    for match in matches:
+        fields = [str(match['Year']), str(match['ID'])]
+        fields.extend(normalize(match.get(column) or '') for column, normalize in columns.items())
+        hasher.update('\x1f'.join(fields).encode('utf-8') + b'\x1e')
+    return hasher
+
+class CachedBoutDecoder:
+    """
+    An engine's fighter IDs and multipliers for the table entries of cached rows
+    (match_cache.CachedMatch), so process() resolves each name, method and
+    competition once rather than once per bout. process() reads fighters and
+    stage_multipliers directly and calls fighter() or stage_multiplier() on a miss.
+    """
+    def __init__(self, engine, tables):
+        self.engine = engine
+        self.tables = tables
+        rules = engine.rules
+        self.fighters = [None] * len(tables.fighters)  # table index -> engine ID, filled in as fighters appear
+        self.results = tables.results
+        # Winner's multipliers; losers and draws get 1.0
+        self.method_multipliers = [rules.method_multiplier(method, 'W') for method in tables.methods]
+        self.event_multipliers = [rules.event_multiplier(competition, 'W') for competition in tables.competitions]
+        self.stage_multipliers = {}  # (competition index, stage index) -> multiplier
+
+    def fighter(self, code):
+        self.fighters[code] = fighter = self.engine.fighter_id(self.tables.fighters[code])
+        return fighter
+
+    def stage_multiplier(self, competition, stage):
+        tables = self.tables
+        found = self.engine.rules.stage_multiplier(tables.competitions[competition], tables.stages[stage])
+        self.stage_multipliers[competition, stage] = found
+        return found
+
+class EloEngine:
+    """
+    Keeps Elo ratings in memory and updates them one bout at a time.
+    Matches are dicts with the fighter_matches.csv columns, with Year and ID as integers.
+    Fighters are referred to by integer ID internally; names (see names) are
+    only needed for queries and exports. Spellings of a name with the same
+    fighter_key() (see fighter_names.py) are the same fighter.
+    leaderboard_split splits the year-end leaderboards by a match column
+    (e.g. 'Weight') or a function of the match; None keeps a single one.
+    rules is a MultiplierRules (default: multiplier_rules.json); method_multipliers
+    and event_multipliers replace its method and event multipliers.
+    system computes each bout's rating changes (see rating_systems.py); the
+    default is an EloSystem with the K-factors given here. Its per-fighter state
+    beyond the rating (e.g. Glicko-2's deviation) is kept in system_state.
+    checkpoint_every keeps a copy of the state at the start of every year ('year')
+    or every N bouts, so as_of() only replays the bouts after the nearest one;
+    None turns them off.
+    decay_rate pulls an inactive fighter's rating towards the initial rating by
+    that fraction per year once they have been idle for more than decay_grace
+    years. It is applied lazily: when the fighter next fights, and when a rating
+    is queried or exported (as of the latest year processed unless a year is given).
+    """
+
+    def __init__(self, initial_rating=INITIAL_RATING, k_new=K_NEW, k_established=K_ESTABLISHED,
+                 provisional_matches=PROVISIONAL_MATCHES, method_multipliers=None, event_multipliers=None,
+                 leaderboard_split=None, rules=None, checkpoint_every=CHECKPOINT_EVERY,
+                 decay_rate=0.0, decay_grace=DECAY_GRACE, system=None):
+        self.initial_rating = initial_rating
+        self.k_new = k_new
+        self.k_established = k_established
+        self.provisional_matches = provisional_matches
+        self.rules = (DEFAULT_RULES if rules is None else rules).with_multipliers(method_multipliers, event_multipliers)
+        self.leaderboard_split = leaderboard_split
+        self.checkpoint_every = checkpoint_every
+        self.decay_rate = decay_rate
+        self.decay_grace = decay_grace
+        if system is None:
+            from rating_systems import EloSystem
+            system = EloSystem(k_new, k_established, provisional_matches, initial_rating, self.rules)
+        self.system = system
+        # A split column decides the leaderboards, so corrections to it count too
+        self.digest_columns = dict(DIGEST_COLUMNS)
+        if isinstance(leaderboard_split, str):
+            self.digest_columns.setdefault(leaderboard_split, str)
+        self.reset()
+
+    def reset(self):
+        """Forget all processed bouts"""
+        # Fighters are interned to dense integer IDs; every per-fighter value
+        # below is an array indexed by that ID
+        self.names = []  # ID -> display name (the first spelling seen)
+        self.keys = []  # ID -> fighter_key(), shared by every spelling of the name
+        self.fighter_ids = {}  # fighter key -> ID
+        self._raw_ids = {}  # raw name as scraped -> ID, so fighter_key runs once per spelling
+        self.ratings = array('d')
+        self.match_counts = array('i')
+        # Track peak Elo and year (0 until the fighter first goes above the initial rating)
+        self.peak_ratings = array('d')
+        self.peak_years = array('i')
+        # Year of each fighter's last bout (0 before the first), for inactivity decay
+        self.last_years = array('i')
+        # The rating system's own per-fighter values
+        self.system_state = {name: array('d') for name in self.system.fields}
+        # track rating history, one row per fighter per bout
+        self.rating_history = RatingHistory()
+        # Latest rating per fighter per year, for year-end leaderboards
+        self.year_end = YearEndLeaderboards(self.leaderboard_split)
+        # Current ratings in rank order; built on the first rank query and
+        # kept up to date after that, so batch runs don't pay for it
+        self.live = None
+        self._decayed_board = None  # (rows processed, year, LiveLeaderboard of decayed ratings)
+        # Last processed (Year, ID) and the number of rows at or before it
+        self.last_key = None
+        self.rows_processed = 0
+        # Every processed row in order, and periodic copies of the state along the way (see as_of)
+        self.processed = []
+        self.checkpoints = []
+        self._checkpoints_from = 0  # No checkpoints before this row (e.g. after restore)
+        self._digest = None  # (rows covered, hashlib object) for rows_digest()
+        self._restored_digest = None  # rows_digest() of the snapshot, while the rows themselves are unknown
+        self._what_if_index = None  # Per-fighter history rows for what_if(), see counterfactual.py
+        self._decoder = None  # CachedBoutDecoder for the tables of the cached rows being processed
+        self._saved_checkpoint = None  # (file, rows, rows_digest()) last loaded or saved, see save_checkpoint()
+
+    def fighter_id(self, raw_name):
+        """Integer ID for a fighter name as it appears in the match data, added if new"""
+        fighter = self._raw_ids.get(raw_name)
+        if fighter is None:
+            key = fighter_key(raw_name)
+            fighter = self.fighter_ids.get(key)
+            if fighter is None:
+                fighter = self._add_fighter(key, display_name(raw_name))
+            self._raw_ids[raw_name] = fighter
+        return fighter
+
+    def _add_fighter(self, key, name):
+        fighter = len(self.names)
+        self.names.append(name)
+        self.keys.append(key)
+        self.fighter_ids[key] = fighter
+        self.ratings.append(self.initial_rating)
+        self.match_counts.append(0)
+        self.peak_ratings.append(self.initial_rating)
+        self.peak_years.append(0)
+        self.last_years.append(0)
+        for field, value in self.system.fields.items():
+            self.system_state[field].append(value)
+        if self.live is not None:
+            self.live.update(fighter, self.initial_rating)
+        return fighter
+
+    def process(self, match):
+        """Apply a single bout. Returns False if the result is unknown and the bout was skipped."""
+        ratings = self.ratings
+        match_counts = self.match_counts
+
+        key = match_key(match)
+        every = self.checkpoint_every
+        if every is not None and self.rows_processed:
+            if (key[0] > self.last_key[0]) if every == 'year' else (self.rows_processed % every == 0):
+                self._add_checkpoint()
+        if self.last_key is None or key > self.last_key:
+            self.last_key = key
+        self.rows_processed += 1
+        self.processed.append(match)
+
+        # Rows from the match cache carry table indexes, resolved once per table entry
+        codes = getattr(match, 'codes', None)
+        if codes is None:
+            fighter = self.fighter_id(match['Fighter_Name'])
+            opponent = self.fighter_id(match['Opponent'])
+            result = match.get('W/L', '').strip().upper()  # 'W', 'L', or 'D'
+        else:
+            decoder = self._decoder
+            if decoder is None or decoder.tables is not match.tables:
+                decoder = self._decoder = CachedBoutDecoder(self, match.tables)
+            fighter = decoder.fighters[codes[0]]
+            if fighter is None:
+                fighter = decoder.fighter(codes[0])
+            opponent = decoder.fighters[codes[1]]
+            if opponent is None:
+                opponent = decoder.fighter(codes[1])
+            result = decoder.results[codes[2]]
+        year = match['Year']
+        match_id = match['ID']
+
+        # Get ratings
+        if self.decay_rate:
+            rating_f = self.current_rating(fighter, year)
+            rating_o = self.current_rating(opponent, year)
+        else:
+            rating_f = ratings[fighter]
+            rating_o = ratings[opponent]
+
+        # Actual scores
+        if result == 'W':
+            actual_f = 1
+        elif result == 'L':
+            actual_f = 0
+        elif result == 'D':
+            actual_f = 0.5
+        else:
+            return False  # Skip if result is unknown
+
+        # Method, competition (only for the winner) and stage multipliers
+        if codes is None:
+            method = match.get('Method', '').strip().lower()
+            competition = match.get('Competition', '').strip().lower()
+            stage = match.get('Stage', '').strip().upper()
+            rules = self.rules
+            multiplier = rules.method_multiplier(method, result)
+            comp_multiplier_f = rules.event_multiplier(competition, result)
+            stage_multiplier = rules.stage_multiplier(competition, stage)
+        else:
+            if result == 'W':
+                multiplier = decoder.method_multipliers[codes[3]]
+                comp_multiplier_f = decoder.event_multipliers[codes[4]]
+            else:
+                multiplier = comp_multiplier_f = 1.0
+            stage_multiplier = decoder.stage_multipliers.get(codes[4:6])
+            if stage_multiplier is None:
+                stage_multiplier = decoder.stage_multiplier(codes[4], codes[5])
+
+        new_rating_f, new_rating_o = self.system.rate_bout(self, fighter, opponent, year, rating_f, rating_o, actual_f,
+                                                           multiplier, comp_multiplier_f, stage_multiplier)
+        ratings[fighter] = new_rating_f
+        ratings[opponent] = new_rating_o
+        self.last_years[fighter] = self.last_years[opponent] = year
+
+        # Update match counts
+        match_counts[fighter] += 1
+        match_counts[opponent] += 1
+
+        # Record rating history
+        self.rating_history.append(fighter, year, match_id, new_rating_f)
+        self.rating_history.append(opponent, year, match_id, new_rating_o)
+        self.year_end.record(match, fighter, new_rating_f)
+        self.year_end.record(match, opponent, new_rating_o)
+        if self.live is not None:
+            self.live.update(fighter, new_rating_f)
+            self.live.update(opponent, new_rating_o)
+
+        # Track peak Elo and year for each fighter
+        if new_rating_f > self.peak_ratings[fighter]:
+            self.peak_ratings[fighter] = new_rating_f
+            self.peak_years[fighter] = year
+        if new_rating_o > self.peak_ratings[opponent]:
+            self.peak_ratings[opponent] = new_rating_o
+            self.peak_years[opponent] = year
+        return True
+
+    def process_many(self, matches):
+        """Apply bouts in the order given. Returns the number of bouts rated."""
+        rated = 0
+        for match in matches:
+            if self.process(match):
+                rated += 1
+        return rated
+
+    def update(self, matches, workers=1):
+        """
+        Bring the engine up to date with the full list of matches.
+        Only bouts after the last processed (Year, ID) are rated; if a bout at or before
+        it was added, removed or corrected since, everything is replayed from scratch.
+        A full replay with workers > 1 rates independent fighter components in parallel
+        (see parallel_rating.py); the result is the same.
+        Returns True if a full replay happened.
+        """
+        if self.last_key is None:
+            self.reset()
+            self._rate_sorted(matches, workers)
+            return True
+
+        last_key = self.last_key
+        new_matches = []
+        old_matches = []
+        for match in matches:
+            if match_key(match) > last_key:
+                new_matches.append(match)
+            else:
+                old_matches.append(match)
+
+        if len(old_matches) != self.rows_processed:
+            print(f"Checkpoint at {last_key} covered {self.rows_processed} rows but found {len(old_matches)}; replaying all matches")
+            self.reset()
+            self._rate_sorted(matches, workers)
+            return True
+
+        old_matches.sort(key=match_key)
+        found = digest_matches(hashlib.sha1(), old_matches, self.digest_columns)
+        if found.hexdigest() != self.rows_digest():
+            print(f"Bouts up to the checkpoint at {last_key} changed since it was taken; replaying all matches")
+            self.reset()
+            self._rate_sorted(matches, workers)
+            return True
+
+        if len(self.processed) != self.rows_processed:
+            # Restored from a checkpoint file, which does not keep the rows themselves
+            self.processed = old_matches
+            self._digest = (self.rows_processed, found)
+
+        print(f"Resuming from checkpoint at {last_key}: {len(new_matches)} new rows")
+        self._rate_sorted(new_matches)
+        return False
+
+    def _rate_sorted(self, matches, workers=1):
+        # Sort matches by Year, then ID
+        with METRICS.timer('sort'):
+            matches = sorted(matches, key=match_key)
+        with METRICS.timer('rating_loop'):
+            if workers > 1 and not self.rows_processed:
+                from parallel_rating import rate_components
+                rated = rate_components(self, matches, workers)
+            else:
+                rated = self.process_many(matches)
+        METRICS.inc('bouts_rated', rated)
+        METRICS.inc('bouts_skipped', len(matches) - rated, reason='unknown_result')
+
+    # Queries
+
+    def lookup(self, fighter):
+        """Integer ID of a fighter by name, or None if they have not fought"""
+        return self.fighter_ids.get(fighter_key(fighter))
+
+    def current_rating(self, fighter, year=None):
+        """Rating of a fighter ID in a year (default: the latest processed), with inactivity decay applied"""
+        rating = self.ratings[fighter]
+        if not self.decay_rate:
+            return rating
+        if year is None:
+            year = self.last_key[0]
+        idle = year - self.last_years[fighter] - self.decay_grace
+        if idle <= 0 or not self.last_years[fighter]:
+            return rating
+        initial = self.initial_rating
+        return initial + (rating - initial) * (1 - self.decay_rate) ** idle
+
+    def rating(self, fighter, year=None):
+        """Current rating of a fighter (the initial rating if they have not fought yet), see current_rating()"""
+        fighter = self.lookup(fighter)
+        return self.initial_rating if fighter is None else self.current_rating(fighter, year)
+
+    def matches(self, fighter):
+        fighter = self.lookup(fighter)
+        return 0 if fighter is None else self.match_counts[fighter]
+
+    def peak(self, fighter):
+        """(peak rating, year it was reached) for a fighter"""
+        fighter = self.lookup(fighter)
+        if fighter is None:
+            return self.initial_rating, None
+        return self.peak_ratings[fighter], self.peak_years[fighter] or None
+
+    def history(self, fighter):
+        """List of (Year, ID, Rating) after each of the fighter's bouts"""
+        fighter = self.lookup(fighter)
+        if fighter is None:
+            return []
+        history = self.rating_history
+        return [(history.years[row], history.match_ids[row], history.ratings[row]) for row in history.rows_for(fighter)]
+
+    def live_leaderboard(self, year=None):
+        """
+        The rank-ordered view of current ratings, built on first use.
+        With inactivity decay everyone's rating moves with the year, so the view of
+        decayed ratings is rebuilt per year and per batch of processed bouts instead.
+        """
+        if self.decay_rate:
+            if year is None:
+                year = self.last_key[0] if self.last_key is not None else 0
+            cached = self._decayed_board
+            if cached is None or cached[:2] != (self.rows_processed, year):
+                board = LiveLeaderboard()
+                for fighter in range(len(self.ratings)):
+                    board.update(fighter, self.current_rating(fighter, year))
+                cached = self._decayed_board = (self.rows_processed, year, board)
+            return cached[2]
+        if self.live is None:
+            self.live = LiveLeaderboard()
+            for fighter, rating in enumerate(self.ratings):
+                self.live.update(fighter, rating)
+        return self.live
+
+    def rank(self, fighter, year=None):
+        """Current 1-based rank of a fighter among everyone rated, or None if they have not fought"""
+        fighter = self.lookup(fighter)
+        if fighter is None:
+            return None
+        return self.live_leaderboard(year).rank_of(fighter)
+
+    def top(self, n=10, min_matches=0, year=None):
+        """The n highest rated fighters with at least min_matches bouts, as (fighter, rating) pairs"""
+        top = []
+        for fighter, rating in self.live_leaderboard(year).iter_ranked():
+            if len(top) >= n:
+                break
+            if self.match_counts[fighter] >= min_matches:
+                top.append((self.names[fighter], rating))
+        return top
+
+    def rated_between(self, low, high, year=None):
+        """Fighters with low <= current rating <= high, as (fighter, rating) pairs, best first"""
+        return [(self.names[fighter], rating) for fighter, rating in self.live_leaderboard(year).between(low, high)]
+
+    def year_end_top(self, year, n=3, division=None):
+        """The n highest (fighter, rating) pairs at the end of a year, from each fighter's last bout that year"""
+        return [(self.names[fighter], rating) for fighter, rating in self.year_end.top(year, n, division)]
+
+    # Historical state
+
+    def _add_checkpoint(self):
+        year = self.last_key[0]
+        self.checkpoints.append({
+            'rows': self.rows_processed,
+            'last_key': self.last_key,
+            'fighters': len(self.names),
+            'ratings': array('d', self.ratings),
+            'match_counts': array('i', self.match_counts),
+            'peak_ratings': array('d', self.peak_ratings),
+            'peak_years': array('i', self.peak_years),
+            'last_years': array('i', self.last_years),
+            'system_state': {name: array('d', values) for name, values in self.system_state.items()},
+            'history_rows': len(self.rating_history),
+            # Earlier years are final, only the current one can still change
+            'year_end': {key: dict(ratings) for key, ratings in self.year_end.year_ratings.items() if key[0] == year},
+        })
+
+    def _fill_checkpoints(self):
+        """Add the checkpoints missing before _checkpoints_from by replaying those rows once"""
+        replay = EloEngine(self.initial_rating, self.k_new, self.k_established, self.provisional_matches,
+                           leaderboard_split=self.leaderboard_split, rules=self.rules, checkpoint_every=self.checkpoint_every,
+                           decay_rate=self.decay_rate, decay_grace=self.decay_grace, system=self.system)
+        replay.process_many(self.processed[:self._checkpoints_from])
+        self.checkpoints = replay.checkpoints + [checkpoint for checkpoint in self.checkpoints
+                                                 if checkpoint['rows'] > replay.rows_processed]
+        self._checkpoints_from = 0
+
+    def as_of(self, when):
+        """
+        Engine holding the state at an earlier point: a year means the start of that
+        year (every bout of the years before), a (Year, ID) key means right after that
+        bout. It starts from the nearest checkpoint and replays only the bouts after it,
+        and shares data with this engine, so treat it as read-only.
+        """
+        if len(self.processed) != self.rows_processed:
+            raise ValueError("The processed rows are unknown after restore(); call update() with all matches first")
+        if isinstance(when, int):
+            end = bisect_left(self.processed, (when,), key=match_key)
+        else:
+            end = bisect_right(self.processed, tuple(when), key=match_key)
+
+        if self._checkpoints_from and self.checkpoint_every is not None and (
+                not self.checkpoints or self.checkpoints[0]['rows'] > end):
+            self._fill_checkpoints()
+        i = bisect_right(self.checkpoints, end, key=lambda checkpoint: checkpoint['rows'])
+        checkpoint = self.checkpoints[i - 1] if i else None
+
+        engine = EloEngine(self.initial_rating, self.k_new, self.k_established, self.provisional_matches,
+                           leaderboard_split=self.leaderboard_split, rules=self.rules, checkpoint_every=None,
+                           decay_rate=self.decay_rate, decay_grace=self.decay_grace, system=self.system)
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint['rows']
+            fighters = checkpoint['fighters']
+            engine.names = self.names[:fighters]
+            engine.keys = self.keys[:fighters]
+            engine.fighter_ids = {key: fighter for fighter, key in enumerate(engine.keys)}
+            engine.ratings = array('d', checkpoint['ratings'])
+            engine.match_counts = array('i', checkpoint['match_counts'])
+            engine.peak_ratings = array('d', checkpoint['peak_ratings'])
+            engine.peak_years = array('i', checkpoint['peak_years'])
+            engine.last_years = array('i', checkpoint['last_years'])
+            engine.system_state = {name: array('d', values) for name, values in checkpoint['system_state'].items()}
+            engine.rating_history = self.rating_history.head(checkpoint['history_rows'])
+            year = checkpoint['last_key'][0]
+            engine.year_end.year_ratings = {key: ratings for key, ratings in self.year_end.year_ratings.items() if key[0] < year}
+            engine.year_end.year_ratings.update((key, dict(ratings)) for key, ratings in checkpoint['year_end'].items())
+            engine.last_key = checkpoint['last_key']
+            engine.rows_processed = start
+            engine.processed = self.processed[:start]
+        engine.process_many(self.processed[start:end])
+        return engine
+
+    def what_if(self, edited=(), inserted=(), removed=()):
+        """Rating changes if some bouts were edited, inserted or removed, without touching this engine (see counterfactual.py)"""
+        from counterfactual import what_if
+        return what_if(self, edited, inserted, removed)
+
+    # Snapshots and checkpoints
+
+    def rows_digest(self):
+        """Hex SHA-1 of the digest columns of every processed row, in order"""
+        if len(self.processed) != self.rows_processed:
+            return self._restored_digest
+        rows, hasher = self._digest or (0, hashlib.sha1())
+        if rows != self.rows_processed:
+            hasher = digest_matches(hasher, self.processed[rows:], self.digest_columns)
+            self._digest = (self.rows_processed, hasher)
+        return hasher.hexdigest()
+
+    def snapshot(self, as_of=None):
+        """Plain-data copy of the engine state, safe to serialize as JSON; as_of takes it at an earlier point (see as_of())"""
+        if as_of is not None:
+            return self.as_of(as_of).snapshot()
+        return {
+            'version': CHECKPOINT_VERSION,
+            'last_key': list(self.last_key) if self.last_key is not None else None,
+            'rows_processed': self.rows_processed,
+            'rows_digest': self.rows_digest(),
+            'fighters': list(self.names),
+            'fighter_keys': list(self.keys),
+            'aliases': aliases_fingerprint(),
+            'rules': self.rules.fingerprint(),
+            'system': self.system.params(),
+            'ratings': self.ratings.tolist(),
+            'match_counts': self.match_counts.tolist(),
+            'peak_ratings': self.peak_ratings.tolist(),
+            'peak_years': self.peak_years.tolist(),
+            'last_years': self.last_years.tolist(),
+            'system_state': {name: values.tolist() for name, values in self.system_state.items()},
+            'decay': [self.decay_rate, self.decay_grace],
+            'rating_history': self.rating_history.to_lists(),
+            'year_end': self.year_end.to_lists(),
+            'leaderboard_split': self.leaderboard_split if not callable(self.leaderboard_split) else None,
+        }
+
+    def restore(self, snapshot):
+        """Replace the engine state with one returned by snapshot()"""
+        if snapshot.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {snapshot.get('version')}")
+        if not callable(self.leaderboard_split) and snapshot['leaderboard_split'] != self.leaderboard_split:
+            raise ValueError(f"Snapshot leaderboards are split by {snapshot['leaderboard_split']!r}, not {self.leaderboard_split!r}")
+        if snapshot['aliases'] != aliases_fingerprint():
+            raise ValueError("Snapshot was taken with a different name alias table")
+        if snapshot['rules'] != self.rules.fingerprint():
+            raise ValueError("Snapshot was taken with different multiplier rules")
+        if snapshot['system'] != self.system.params():
+            raise ValueError(f"Snapshot was taken with rating system {snapshot['system']}, not {self.system.params()}")
+        if snapshot['decay'] != [self.decay_rate, self.decay_grace]:
+            raise ValueError(f"Snapshot was taken with decay {snapshot['decay']}, not {[self.decay_rate, self.decay_grace]}")
+        self.reset()
+        self.last_key = tuple(snapshot['last_key']) if snapshot['last_key'] is not None else None
+        self.rows_processed = snapshot['rows_processed']
+        self._restored_digest = snapshot['rows_digest']
+        self.names = list(snapshot['fighters'])
+        self.keys = list(snapshot['fighter_keys'])
+        self.fighter_ids = {key: fighter for fighter, key in enumerate(self.keys)}
+        self.ratings = array('d', snapshot['ratings'])
+        self.match_counts = array('i', snapshot['match_counts'])
+        self.peak_ratings = array('d', snapshot['peak_ratings'])
+        self.peak_years = array('i', snapshot['peak_years'])
+        self.last_years = array('i', snapshot['last_years'])
+        self.system_state = {name: array('d', snapshot['system_state'][name]) for name in self.system.fields}
+        history = snapshot['rating_history']
+        # load_checkpoint() reads the history from its binary file straight into a RatingHistory
+        self.rating_history = history if isinstance(history, RatingHistory) else RatingHistory.from_lists(history)
+        self.year_end.load_lists(snapshot['year_end'])
+        self._checkpoints_from = self.rows_processed
+
+    def save_checkpoint(self, filename):
+        """
+        Write the engine state to disk: JSON, with the rating history in a binary
+        file next to it (filename + '.history'). Skipped if the files already hold
+        this state, i.e. no rows were rated since they were loaded or saved.
+        Returns True if the files were written.
+        """
+        if (self._saved_checkpoint == (filename, self.rows_processed, self.rows_digest())
+                and os.path.exists(filename) and os.path.exists(history_filename(filename))):
+            return False
+        snapshot = self.snapshot()
+        del snapshot['rating_history']
+        tmp_filename = history_filename(filename) + '.tmp'
+        layout = self.rating_history.save(tmp_filename)
+        # The JSON names the exact history it goes with, so a crash between the two replaces is caught on load
+        snapshot['rating_history_file'] = {'columns': layout, 'sha1': history_digest(tmp_filename)}
+        os.replace(tmp_filename, history_filename(filename))
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        # Replace atomically so a crash never leaves a half-written checkpoint
+        os.replace(tmp_filename, filename)
+        self._saved_checkpoint = (filename, self.rows_processed, snapshot['rows_digest'])
+        return True
+
+    def load_checkpoint(self, filename):
+        """Load engine state saved by save_checkpoint. Returns False if there is no usable checkpoint."""
+        if not os.path.exists(filename):
+            return False
+        try:
+            with open(filename, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            history_file = snapshot.get('rating_history_file')
+            if history_file is not None:
+                if history_digest(history_filename(filename)) != history_file['sha1']:
+                    raise ValueError(f"{history_filename(filename)} does not belong to this checkpoint")
+                snapshot['rating_history'] = RatingHistory.load(history_filename(filename), history_file['columns'])
+            self.restore(snapshot)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable checkpoint {filename}: {e}")
+            self.reset()
+            return False
+        self._saved_checkpoint = (filename, self.rows_processed, snapshot['rows_digest'])
+        return True
+
+    # Export
+
+    def export(self, sinks):
+        """Hand the current state to each sink (see elo_sinks.py)"""
+        for sink in sinks:
+            with METRICS.timer(f"export {getattr(sink, 'filename', type(sink).__name__)}"):
+                sink.write(self)
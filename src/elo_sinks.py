@@ -0,0 +1,107 @@
+"""
+Sinks that export an EloEngine's state. A sink is any object with a
+write(engine) method; pass a list of them to EloEngine.export().
+"""
+import csv
+from history_store import save_history
+
+# Fighters with fewer matches are left out of elo_ratings.csv
+MIN_MATCHES = 10
+
+class EloRatingsCsvSink:
+    """Name, peak elo, peak elo year, current elo and number of matches per fighter"""
+
+    def __init__(self, filename='elo_ratings.csv', min_matches=MIN_MATCHES):
+        self.filename = filename
+        self.min_matches = min_matches
+
+    def write(self, engine):
+        min_matches = self.min_matches
+        # Fighters are already one per fighter_key, so every engine entry is one row
+        entries = []
+        for fighter, key in enumerate(engine.keys):
+            peak_year = engine.peak_years[fighter] or None
+            entries.append({
+                # For display, use a title-cased version of the fighter key
+                'Fighter': key.title(),
+                # Fighters who never went above the start keep the initial rating as their peak
+                'Peak_Elo': round(engine.peak_ratings[fighter], 2) if peak_year else engine.initial_rating,
+                'Peak_Elo_Year': peak_year,
+                'Current_Elo': round(engine.current_rating(fighter), 2),
+                'Matches': engine.match_counts[fighter]
+            })
+
+        # Filter out fighters with too few matches
+        filtered_entries = [entry for entry in entries if entry['Matches'] >= min_matches]
+
+        # Print filtering statistics
+        total_fighters = len(entries)
+        filtered_fighters = len(filtered_entries)
+        removed_fighters = total_fighters - filtered_fighters
+        print(f"Filtering fighters with less than {min_matches} matches:")
+        print(f"Total fighters: {total_fighters}")
+        print(f"Fighters with {min_matches}+ matches: {filtered_fighters}")
+        print(f"Fighters removed: {removed_fighters}")
+
+        with open(self.filename, 'w', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['Fighter', 'Peak_Elo', 'Peak_Elo_Year', 'Current_Elo', 'Matches']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in sorted(filtered_entries, key=lambda x: -x['Current_Elo']):
+                writer.writerow(row)
+
+class RatingHistoryCsvSink:
+    """Every fighter's rating after each of their bouts"""
+
+    def __init__(self, filename='rating_history.csv'):
+        self.filename = filename
+
+    def write(self, engine):
+        with open(self.filename, 'w', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['Fighter', 'Year', 'ID', 'Rating']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            history = engine.rating_history
+            for row in history.rows_by_fighter():
+                writer.writerow({
+                    'Fighter': engine.names[history.fighters[row]],
+                    'Year': history.years[row],
+                    'ID': history.match_ids[row],
+                    'Rating': round(history.ratings[row], 2)
+                })
+
+class RatingHistoryBinarySink:
+    """The rating history as raw columns plus a JSON sidecar, see history_store.load_history"""
+
+    def __init__(self, filename='rating_history.bin'):
+        self.filename = filename
+
+    def write(self, engine):
+        save_history(engine.rating_history, engine.names, self.filename)
+
+class TopByYearCsvSink:
+    """
+    The top Elo ratings at the end of each year, one table per division if the
+    engine splits its leaderboards
+    """
+
+    def __init__(self, filename='top3_by_year.csv', n=3):
+        self.filename = filename
+        self.n = n
+
+    def write(self, engine):
+        year_end = engine.year_end
+        with open(self.filename, 'w', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['Year', 'Rank', 'Fighter', 'Elo']
+            if year_end.split is not None:
+                fieldnames.insert(1, 'Division')
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for year in year_end.years():
+                for division in year_end.divisions(year):
+                    # Write out the top n for this year
+                    for rank, (fighter, elo) in enumerate(year_end.top(year, self.n, division), 1):
+                        row = {'Year': int(year), 'Rank': int(rank), 'Fighter': engine.names[fighter], 'Elo': round(elo, 2)}
+                        if year_end.split is not None:
+                            row['Division'] = division
+                        writer.writerow(row)
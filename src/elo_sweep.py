@@ -0,0 +1,225 @@
+"""
+Evaluate many Elo parameter sets in one pass over the match stream.
+
+Ratings for every configuration are kept in one NumPy matrix (fighters x
+configurations) and updated together for each bout. Before each update the
+expected score is used as a prediction, and log-loss and Brier score are
+accumulated per configuration.
+
+Parameters are given by flat names: k_new, k_established, provisional_matches,
+method.<class> for the METHOD_MULTIPLIERS classes and event.<keyword> for
+competition keywords. A grid file is JSON mapping parameter names to lists of
+values; every combination is evaluated and unspecified parameters keep their
+default values.
+"""
+import argparse
+import csv
+import itertools
+import json
+import numpy as np
+from elo_engine import (INITIAL_RATING, K_NEW, K_ESTABLISHED, PROVISIONAL_MATCHES, METHOD_MULTIPLIERS,
+                        EVENT_MULTIPLIERS, DEFAULT_RULES, elo_changes, expected_score, match_key)
+from match_cache import load_match_store
+from fighter_names import fighter_key
+from multiplier_rules import KeywordMatcher
+
+METHOD_CLASSES = list(METHOD_MULTIPLIERS)
+
+# Keeps log(0) out of the log-loss when a configuration is certain and wrong
+EPSILON = 1e-15
+
+def default_config():
+    config = {
+        'k_new': K_NEW,
+        'k_established': K_ESTABLISHED,
+        'provisional_matches': PROVISIONAL_MATCHES,
+    }
+    for name, multiplier in METHOD_MULTIPLIERS.items():
+        config[f'method.{name}'] = multiplier
+    for keyword, multiplier in EVENT_MULTIPLIERS.items():
+        config[f'event.{keyword}'] = multiplier
+    return config
+
+def expand_grid(grid):
+    """Every combination of the values in grid, on top of the default config"""
+    names = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = default_config()
+        config.update(zip(names, values))
+        configs.append(config)
+    return configs
+
+def event_keywords(configs):
+    """All competition keywords used by any configuration, defaults first"""
+    keywords = list(EVENT_MULTIPLIERS)
+    for config in configs:
+        for name in config:
+            if name.startswith('event.') and name[len('event.'):] not in keywords:
+                keywords.append(name[len('event.'):])
+    return keywords
+
+def encode_matches(matches, keywords, rules=DEFAULT_RULES):
+    """
+    Turn match rows into parallel arrays of fighter indexes and per-bout
+    constants so the sweep loop never touches strings. Methods are indexes
+    into the method classes of rules, in the order of its method_multipliers.
+    Rows from the match cache are resolved once per table entry, not per bout.
+    """
+    event_matcher = KeywordMatcher(keywords)
+    method_classes = {name: i for i, name in enumerate(rules.method_multipliers)}
+    fighter_index = {}
+    decoded = {}  # id(tables) -> (tables, lookups by table index), for rows from the match cache
+    fighters, opponents, actuals, wins, methods, events, stages, years = [], [], [], [], [], [], [], []
+    for match in sorted(matches, key=match_key):
+        codes = getattr(match, 'codes', None)
+        if codes is None:
+            result = match.get('W/L', '').strip().upper()
+        else:
+            tables, fighter_codes, method_codes, event_codes, stage_codes = decoded.get(id(match.tables), (None,) * 5)
+            if tables is not match.tables:
+                tables = match.tables
+                fighter_codes = [None] * len(tables.fighters)
+                method_codes = [method_classes[rules.method_class(method)] for method in tables.methods]
+                event_codes = [event_matcher.first(competition) for competition in tables.competitions]
+                stage_codes = {}
+                decoded[id(tables)] = (tables, fighter_codes, method_codes, event_codes, stage_codes)
+            result = tables.results[codes[2]]
+        if result == 'W':
+            actual = 1.0
+        elif result == 'L':
+            actual = 0.0
+        elif result == 'D':
+            actual = 0.5
+        else:
+            continue  # Skip if result is unknown
+
+        if codes is None:
+            method = match.get('Method', '').strip().lower()
+            competition = match.get('Competition', '').strip().lower()
+            stage = match.get('Stage', '').strip().upper()
+            fighters.append(fighter_index.setdefault(fighter_key(match['Fighter_Name']), len(fighter_index)))
+            opponents.append(fighter_index.setdefault(fighter_key(match['Opponent']), len(fighter_index)))
+            methods.append(method_classes[rules.method_class(method)])
+            events.append(event_matcher.first(competition) if result == 'W' else -1)
+            stages.append(rules.stage_multiplier(competition, stage))
+        else:
+            fighter = fighter_codes[codes[0]]
+            if fighter is None:
+                key = fighter_key(tables.fighters[codes[0]])
+                fighter = fighter_codes[codes[0]] = fighter_index.setdefault(key, len(fighter_index))
+            opponent = fighter_codes[codes[1]]
+            if opponent is None:
+                key = fighter_key(tables.fighters[codes[1]])
+                opponent = fighter_codes[codes[1]] = fighter_index.setdefault(key, len(fighter_index))
+            fighters.append(fighter)
+            opponents.append(opponent)
+            methods.append(method_codes[codes[3]])
+            events.append(event_codes[codes[4]] if result == 'W' else -1)
+            stage = stage_codes.get(codes[4:6])
+            if stage is None:
+                stage = stage_codes[codes[4:6]] = rules.stage_multiplier(tables.competitions[codes[4]], tables.stages[codes[5]])
+            stages.append(stage)
+        actuals.append(actual)
+        wins.append(result == 'W')
+        years.append(match['Year'])
+    return fighter_index, fighters, opponents, actuals, wins, methods, events, stages, years
+
+def run_sweep(matches, configs, min_year=None):
+    """
+    Rate matches under every configuration at once.
+    Bouts before min_year still update ratings but are not scored.
+    Returns one dict per configuration with its parameters, log_loss and brier.
+    """
+    keywords = event_keywords(configs)
+    fighter_index, fighters, opponents, actuals, wins, methods, events, stages, years = encode_matches(matches, keywords)
+    defaults = default_config()
+
+    def column(name):
+        return np.array([config.get(name, defaults.get(name, 1.0)) for config in configs], dtype=float)
+
+    k_new = column('k_new')
+    k_established = column('k_established')
+    provisional = column('provisional_matches')
+    method_multipliers = np.stack([column(f'method.{name}') for name in METHOD_CLASSES])
+    # Keywords a configuration does not mention count as 1.0
+    event_multipliers = np.stack([column(f'event.{keyword}') for keyword in keywords]) if keywords else np.ones((0, len(configs)))
+
+    ratings = np.full((len(fighter_index), len(configs)), INITIAL_RATING, dtype=float)
+    match_counts = [0] * len(fighter_index)
+    log_loss = np.zeros(len(configs))
+    brier = np.zeros(len(configs))
+    scored = 0
+
+    for f, o, actual, win, method, event, stage, year in zip(fighters, opponents, actuals, wins, methods, events, stages, years):
+        rating_f = ratings[f]
+        rating_o = ratings[o]
+        expected_f = expected_score(rating_f, rating_o)
+
+        if min_year is None or year >= min_year:
+            p = np.clip(expected_f, EPSILON, 1 - EPSILON)
+            log_loss -= actual * np.log(p) + (1 - actual) * np.log(1 - p)
+            brier += (expected_f - actual) ** 2
+            scored += 1
+
+        k_f = np.where(match_counts[f] < provisional, k_new, k_established)
+        k_o = np.where(match_counts[o] < provisional, k_new, k_established)
+        method_multiplier = method_multipliers[method] if win else 1.0
+        event_multiplier = event_multipliers[event] if win and event >= 0 else 1.0
+        change_f, change_o = elo_changes(expected_f, k_f, k_o, actual, method_multiplier, event_multiplier, stage)
+        ratings[f] = rating_f + change_f
+        ratings[o] = rating_o + change_o
+
+        match_counts[f] += 1
+        match_counts[o] += 1
+
+    results = []
+    for i, config in enumerate(configs):
+        result = dict(config)
+        result['log_loss'] = log_loss[i] / scored if scored else float('nan')
+        result['brier'] = brier[i] / scored if scored else float('nan')
+        result['bouts_scored'] = scored
+        results.append(result)
+    return results
+
+def write_results(results, filename):
+    """Write sweep results sorted by log-loss, best first"""
+    fieldnames = list(results[0]) if results else []
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, restval=1.0)
+        writer.writeheader()
+        for row in sorted(results, key=lambda x: x['log_loss']):
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate Elo parameter sets by predictive log-loss and Brier score')
+    parser.add_argument('--grid', help='JSON file mapping parameter names to lists of values')
+    parser.add_argument('--matches', default='fighter_matches.csv')
+    parser.add_argument('--min-year', type=int, help='only score bouts from this year on')
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    if args.grid:
+        with open(args.grid, encoding='utf-8') as f:
+            configs = expand_grid(json.load(f))
+    else:
+        configs = expand_grid({
+            'k_new': [24, 32, 40, 48],
+            'k_established': [12, 16, 20, 24],
+            'provisional_matches': [5, 10, 15],
+        })
+
+    store = load_match_store(args.matches)
+    print(f"Evaluating {len(configs)} configurations over {len(store)} bouts")
+    results = run_sweep(list(store), configs, min_year=args.min_year)
+    write_results(results, args.out)
+
+    best = min(results, key=lambda x: x['log_loss'])
+    print(f"Best log-loss {best['log_loss']:.4f} (Brier {best['brier']:.4f}):")
+    for name, value in best.items():
+        if name not in ('log_loss', 'brier', 'bouts_scored'):
+            print(f"  {name}: {value}")
+    print(f"Results saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Asynchronous page fetching for the scraper.
+
+Fetcher keeps a bounded number of requests in flight, spaces out requests to
+the same host, and retries throttled (429), failed (5xx) and dropped requests
+with exponential backoff, honouring Retry-After when the server sends one.
+Every URL ends up as a FetchResult, so callers can report the ones that still
+failed and retry them later.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Statuses worth another try; anything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class FetchSettings:
+    def __init__(self, concurrency=10, requests_per_second=5.0, max_retries=4, backoff_base=1.0,
+                 backoff_max=60.0, timeout=10.0, user_agent=USER_AGENT):
+        self.concurrency = concurrency  # Requests in flight at once
+        self.requests_per_second = requests_per_second  # Per host; 0 or None for no limit
+        self.max_retries = max_retries  # Retries after the first attempt
+        self.backoff_base = backoff_base  # Seconds before the first retry, doubled on each further one
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.user_agent = user_agent
+
+class FetchResult:
+    def __init__(self, url, status=None, text=None, headers=None, attempts=0, error=None):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.headers = headers or {}
+        self.attempts = attempts
+        self.error = error
+        self.elapsed = 0.0  # Seconds from the first attempt to the final answer, backoff included
+
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and 200 <= self.status < 300
+
+    @property
+    def not_modified(self):
+        """The server answered a conditional request with 304"""
+        return self.error is None and self.status == 304
+
+    def describe_failure(self):
+        if self.error:
+            return self.error
+        return f"HTTP {self.status}"
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class HostRateLimiter:
+    """Keeps at least 1 / requests_per_second seconds between requests to the same host"""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}  # host -> loop time of the next allowed request
+        self._locks = {}
+
+    async def wait(self, host):
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(host)
+        if lock is None:
+            lock = self._locks[host] = asyncio.Lock()
+        async with lock:
+            now = loop.time()
+            slot = self._next_slot.get(host, now)
+            if slot > now:
+                await asyncio.sleep(slot - now)
+                now = slot
+            self._next_slot[host] = now + self.interval
+
+    def hold_off(self, host, delay):
+        """Push back every request to host by at least delay seconds (e.g. after a 429)"""
+        loop = asyncio.get_running_loop()
+        self._next_slot[host] = max(self._next_slot.get(host, 0.0), loop.time() + delay)
+
+class Fetcher:
+    """
+    Use as an async context manager:
+
+        async with Fetcher(settings) as fetcher:
+            async for result in fetcher.fetch_all(urls):
+                ...
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or FetchSettings()
+        self.limiter = HostRateLimiter(self.settings.requests_per_second)
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.settings.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers={'User-Agent': self.settings.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.settings.timeout),
+            connector=aiohttp.TCPConnector(limit=self.settings.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Delay before retry number attempt (1-based): exponential with jitter, at least Retry-After"""
+        delay = min(self.settings.backoff_max, self.settings.backoff_base * 2 ** (attempt - 1))
+        delay *= random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.settings.backoff_max))
+        return delay
+
+    async def fetch(self, url, headers=None):
+        """GET url with retries. Never raises for HTTP or network errors; see FetchResult.error."""
+        host = urlsplit(url).netloc
+        result = FetchResult(url)
+        start = time.perf_counter()
+        try:
+            return await self._fetch(url, headers, host, result)
+        finally:
+            result.elapsed = time.perf_counter() - start
+
+    async def _fetch(self, url, headers, host, result):
+        for attempt in range(1, self.settings.max_retries + 2):
+            result.attempts = attempt
+            retry_after = None
+            # Only hold a concurrency slot while the request is actually in flight
+            async with self._semaphore:
+                await self.limiter.wait(host)
+                try:
+                    async with self._session.get(url, headers=headers) as response:
+                        result.status = response.status
+                        result.headers = response.headers.copy()  # Case-insensitive
+                        if response.status in RETRY_STATUSES:
+                            result.error = f"HTTP {response.status}"
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        else:
+                            result.text = await response.text()
+                            result.error = None if response.status < 400 else f"HTTP {response.status}"
+                            return result
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result.status = None
+                    result.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+            if attempt > self.settings.max_retries:
+                break
+            delay = self.backoff_delay(attempt, retry_after)
+            if result.status == 429:
+                # The whole host is throttling us, not just this URL
+                self.limiter.hold_off(host, delay)
+            await asyncio.sleep(delay)
+        return result
+
+    async def fetch_all(self, urls, headers=None):
+        """
+        Fetch every URL, yielding FetchResults as they complete.
+        headers is either one dict for every request or a function of the URL.
+        """
+        if callable(headers):
+            tasks = [asyncio.ensure_future(self.fetch(url, headers(url))) for url in urls]
+        else:
+            tasks = [asyncio.ensure_future(self.fetch(url, headers)) for url in urls]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+def write_failure_report(failures, filename):
+    """One line per URL that could not be fetched or parsed: url, attempts, reason"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        for url, attempts, reason in failures:
+            f.write(f"{url}\t{attempts}\t{reason}\n")
+
+def read_failure_report(filename):
+    """URLs listed in a report written by write_failure_report"""
+    with open(filename, encoding='utf-8') as f:
+        return [line.split('\t', 1)[0] for line in f if line.strip()]
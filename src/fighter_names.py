@@ -0,0 +1,82 @@
+"""
+Fighter name canonicalization, shared by the engine, the sweep and the exports.
+
+fighter_key() turns a name as scraped ("Roberto 'Roleta' Magalhães |",
+"Roberto Magalhaes") into a stable key: ASCII, lowercase, without pipes or a
+quoted nickname. Spellings the rules cannot unify are mapped through the alias
+table in name_aliases.csv. The same few thousand names come up on every row,
+so results are memoized in bounded LRU caches.
+"""
+import csv
+import hashlib
+import os
+import re
+from functools import lru_cache
+from unidecode import unidecode
+
+ALIASES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'name_aliases.csv')
+CACHE_SIZE = 65536
+
+_WHITESPACE = re.compile(r'\s+')
+# "Gabi", “Righetti”, or 'Roleta' between spaces (so O'Brien keeps its apostrophe)
+_NICKNAME = re.compile(r'["“”][^"“”]*["“”]|(?<!\S)\'[^\']*\'(?!\S)')
+
+def clean_name(name):
+    # Remove leading/trailing spaces, collapse multiple spaces, and fix repeated names
+    name = name.strip()
+    name = _WHITESPACE.sub(' ', name)  # Collapse multiple spaces
+    # Remove repeated names
+    if len(name) % 2 == 0:
+        half = len(name) // 2
+        if name[:half] == name[half:]:
+            name = name[:half]
+    return name
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_name(name):
+    """ASCII, lowercase, pipes removed and spaces collapsed (same as old_scraper's normalize_fighter_name)"""
+    normalized = unidecode(name).strip().strip('|').strip()
+    normalized = normalized.replace('|', '')
+    return _WHITESPACE.sub(' ', normalized).lower()
+
+def display_name(name):
+    """Cleaned spelling of a name for output, keeping accents and nickname"""
+    return _WHITESPACE.sub(' ', clean_name(name).replace('|', '')).strip()
+
+def _rule_key(name):
+    return normalize_name(_NICKNAME.sub(' ', clean_name(name)))
+
+def load_aliases(filename=ALIASES_FILE):
+    """{variant key: fighter key} from a CSV with Alias and Fighter columns (empty if there is no file)"""
+    aliases = {}
+    try:
+        with open(filename, newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                alias, fighter = _rule_key(row['Alias']), _rule_key(row['Fighter'])
+                if alias != fighter:
+                    aliases[alias] = fighter
+    except FileNotFoundError:
+        pass
+    return aliases
+
+_aliases = load_aliases()
+
+def use_aliases(aliases):
+    """Replace the alias table, e.g. with load_aliases(another_file)"""
+    global _aliases
+    _aliases = dict(aliases)
+    fighter_key.cache_clear()
+
+def current_aliases():
+    """Copy of the alias table in use, e.g. to hand to use_aliases() in a worker process"""
+    return dict(_aliases)
+
+def aliases_fingerprint():
+    """Digest of the alias table; fighter keys (and checkpoints) depend on it"""
+    return hashlib.sha1(repr(sorted(_aliases.items())).encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def fighter_key(name):
+    """Stable identity of a fighter, for any spelling of their name"""
+    key = _rule_key(name)
+    return _aliases.get(key, key)
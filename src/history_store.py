@@ -0,0 +1,322 @@
+"""
+Columnar rating history: one row per fighter per bout, held as parallel
+typed arrays (fighter ID, year, match ID, rating) instead of a dict per row.
+
+save_history() writes the columns back to back into a raw binary file, grouped
+by fighter, with a small JSON sidecar describing the layout and the fighter
+names. Next to it goes an index file with each fighter's first row and the
+first row of each year they fought in, so one fighter's series or their
+rating as of a given year/match is a couple of binary searches away.
+load_history() maps both files and returns zero-copy memoryviews; NumPy users
+can open the same files with np.memmap using the offsets from the sidecar.
+"""
+import json
+import mmap
+import sys
+from array import array
+from bisect import bisect_right
+
+FORMAT_VERSION = 2
+
+# Column name -> array typecode, in file order
+COLUMNS = [
+    ('fighter', 'i'),
+    ('year', 'i'),
+    ('match_id', 'i'),
+    ('rating', 'd'),
+]
+
+# Index column name -> array typecode, in file order. Offsets are CSR style:
+# fighter f owns rows fighter_offsets[f]:fighter_offsets[f + 1] and year table
+# entries year_offsets[f]:year_offsets[f + 1]
+INDEX_COLUMNS = [
+    ('fighter_offsets', 'q'),
+    ('year_offsets', 'q'),
+    ('year_years', 'i'),
+    ('year_rows', 'q'),
+]
+
+# NumPy dtype strings for the sidecar
+NUMPY_DTYPES = {'i': 'int32', 'q': 'int64', 'd': 'float64'}
+
+# Columns start on 8-byte boundaries so float64 columns can be cast in place
+ALIGNMENT = 8
+
+class RatingHistory:
+    def __init__(self):
+        self.fighters = array('i')
+        self.years = array('i')
+        self.match_ids = array('i')
+        self.ratings = array('d')
+        # fighter ID -> their row numbers, oldest first, for the first _indexed rows; extended on demand
+        self._fighter_rows = {}
+        self._indexed = 0
+
+    def append(self, fighter, year, match_id, rating):
+        self.fighters.append(fighter)
+        self.years.append(year)
+        self.match_ids.append(match_id)
+        self.ratings.append(rating)
+
+    def __len__(self):
+        return len(self.fighters)
+
+    def columns(self):
+        return {'fighter': self.fighters, 'year': self.years, 'match_id': self.match_ids, 'rating': self.ratings}
+
+    def head(self, rows):
+        """Copy of the first rows"""
+        history = RatingHistory()
+        history.fighters = self.fighters[:rows]
+        history.years = self.years[:rows]
+        history.match_ids = self.match_ids[:rows]
+        history.ratings = self.ratings[:rows]
+        return history
+
+    def fighter_rows(self):
+        """{fighter ID: row numbers of their entries, oldest first}; only rows appended since the last call are indexed"""
+        fighters = self.fighters
+        if self._indexed > len(fighters):
+            self._fighter_rows, self._indexed = {}, 0
+        fighter_rows = self._fighter_rows
+        for row in range(self._indexed, len(fighters)):
+            rows = fighter_rows.get(fighters[row])
+            if rows is None:
+                fighter_rows[fighters[row]] = [row]
+            else:
+                rows.append(row)
+        self._indexed = len(fighters)
+        return fighter_rows
+
+    def rows_for(self, fighter):
+        """Row numbers of one fighter's entries, oldest first"""
+        return list(self.fighter_rows().get(fighter, ()))
+
+    def rows_by_fighter(self):
+        """All row numbers grouped by fighter ID, each fighter's rows oldest first"""
+        return sorted(range(len(self.fighters)), key=self.fighters.__getitem__)
+
+    def to_lists(self):
+        return {name: column.tolist() for name, column in self.columns().items()}
+
+    def save(self, filename):
+        """Write the columns to a raw binary file; returns their layout (see write_columns)"""
+        return write_columns(filename, self.columns(), COLUMNS)
+
+    @classmethod
+    def load(cls, filename, layout):
+        """Read columns written by save()"""
+        with open(filename, 'rb') as f:
+            data = f.read()
+        history = cls()
+        columns = history.columns()
+        for column in layout:
+            values = columns[column['name']]
+            values.frombytes(data[column['offset']:column['offset'] + values.itemsize * column['length']])
+            if len(values) != column['length']:
+                raise ValueError(f"{filename} is shorter than its layout")
+        return history
+
+    @classmethod
+    def from_lists(cls, data):
+        history = cls()
+        history.fighters = array('i', data['fighter'])
+        history.years = array('i', data['year'])
+        history.match_ids = array('i', data['match_id'])
+        history.ratings = array('d', data['rating'])
+        return history
+
+def sidecar_filename(filename):
+    return filename + '.json'
+
+def index_filename(filename):
+    return filename + '.idx'
+
+def write_columns(filename, columns, spec):
+    """Write columns back to back, aligned, and return their layout for the sidecar"""
+    layout = []
+    offset = 0
+    with open(filename, 'wb') as f:
+        for name, typecode in spec:
+            column = columns[name]
+            padding = -offset % ALIGNMENT
+            f.write(b'\0' * padding)
+            offset += padding
+            layout.append({
+                'name': name,
+                'typecode': typecode,
+                'dtype': NUMPY_DTYPES[typecode],
+                'offset': offset,
+                'length': len(column),
+            })
+            column.tofile(f)
+            offset += len(column) * column.itemsize
+    return layout
+
+def build_index(history, order, fighter_count):
+    """Per-fighter row offsets and per-fighter-year first rows for rows written in order"""
+    fighter_offsets = array('q', [0] * (fighter_count + 1))
+    year_offsets = array('q', [0] * (fighter_count + 1))
+    year_years = array('i')
+    year_rows = array('q')
+    prev_fighter = prev_year = None
+    for out_row, row in enumerate(order):
+        fighter = history.fighters[row]
+        year = history.years[row]
+        fighter_offsets[fighter + 1] += 1
+        if fighter != prev_fighter or year != prev_year:
+            year_offsets[fighter + 1] += 1
+            year_years.append(year)
+            year_rows.append(out_row)
+            prev_fighter, prev_year = fighter, year
+    # Counts to running offsets
+    for f in range(fighter_count):
+        fighter_offsets[f + 1] += fighter_offsets[f]
+        year_offsets[f + 1] += year_offsets[f]
+    return {
+        'fighter_offsets': fighter_offsets,
+        'year_offsets': year_offsets,
+        'year_years': year_years,
+        'year_rows': year_rows,
+    }
+
+def save_history(history, names, filename='rating_history.bin'):
+    """
+    Write the history columns to filename, grouped by fighter, the index to
+    filename.idx and the layout plus fighter names to filename.json
+    """
+    order = history.rows_by_fighter()
+    grouped = {}
+    for name, typecode in COLUMNS:
+        column = history.columns()[name]
+        grouped[name] = array(typecode, [column[row] for row in order])
+    layout = write_columns(filename, grouped, COLUMNS)
+    index_layout = write_columns(index_filename(filename), build_index(history, order, len(names)), INDEX_COLUMNS)
+
+    sidecar = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'rows': len(history),
+        'columns': layout,
+        'index': index_layout,
+        'fighters': list(names),
+    }
+    with open(sidecar_filename(filename), 'w', encoding='utf-8') as f:
+        json.dump(sidecar, f)
+
+class MappedHistory:
+    """
+    Read-only history loaded with load_history(). Columns are memoryviews over
+    the mapped files, so nothing is parsed or copied until it is read.
+    Fighters are looked up by name as it appears in engine.names, or by ID.
+    """
+
+    def __init__(self, filename, sidecar, mappings, columns):
+        self.filename = filename
+        self.rows = sidecar['rows']
+        self.names = sidecar['fighters']
+        self.fighters = columns['fighter']
+        self.years = columns['year']
+        self.match_ids = columns['match_id']
+        self.ratings = columns['rating']
+        self.fighter_offsets = columns['fighter_offsets']
+        self.year_offsets = columns['year_offsets']
+        self.year_years = columns['year_years']
+        self.year_rows = columns['year_rows']
+        self._fighter_ids = None
+        self._mappings = mappings
+        self._columns = columns
+
+    def __len__(self):
+        return self.rows
+
+    def row(self, i):
+        """(fighter name, year, match ID, rating) for row i"""
+        return self.names[self.fighters[i]], self.years[i], self.match_ids[i], self.ratings[i]
+
+    def fighter_id(self, fighter):
+        if isinstance(fighter, int):
+            return fighter if 0 <= fighter < len(self.names) else None
+        if self._fighter_ids is None:
+            self._fighter_ids = {name: i for i, name in enumerate(self.names)}
+        return self._fighter_ids.get(fighter)
+
+    def fighter_rows(self, fighter):
+        """range of the rows belonging to a fighter (empty if unknown)"""
+        fighter = self.fighter_id(fighter)
+        if fighter is None:
+            return range(0)
+        return range(self.fighter_offsets[fighter], self.fighter_offsets[fighter + 1])
+
+    def series(self, fighter):
+        """A fighter's (Year, ID, Rating) after each bout, oldest first"""
+        return [(self.years[row], self.match_ids[row], self.ratings[row]) for row in self.fighter_rows(fighter)]
+
+    def rating_as_of(self, fighter, year, match_id=None):
+        """
+        A fighter's rating after their last bout up to and including the given
+        year (and, within that year, match ID). None if they had not fought yet.
+        """
+        fighter = self.fighter_id(fighter)
+        if fighter is None:
+            return None
+        first_year = self.year_offsets[fighter]
+        last_year = self.year_offsets[fighter + 1]
+        # Year table entry for the last year at or before the one asked for
+        entry = bisect_right(self.year_years, year, first_year, last_year) - 1
+        if entry < first_year:
+            return None
+        start = self.year_rows[entry]
+        end = self.year_rows[entry + 1] if entry + 1 < last_year else self.fighter_offsets[fighter + 1]
+        if match_id is not None and self.year_years[entry] == year:
+            # Only part of this year counts, find the last bout at or before match_id
+            row = bisect_right(self.match_ids, match_id, start, end) - 1
+            if row < start:
+                if entry == first_year:
+                    return None
+                row = start - 1  # Last bout of the previous year the fighter fought in
+            return self.ratings[row]
+        return self.ratings[end - 1]
+
+    def close(self):
+        for column in self._columns.values():
+            column.release()
+        for mapping in self._mappings:
+            mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def map_columns(filename, layout, mappings):
+    """memoryviews over the columns of one file written by write_columns"""
+    columns = {}
+    if any(column['length'] for column in layout):
+        with open(filename, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mappings.append(mapping)
+        view = memoryview(mapping)
+        for column in layout:
+            size = array(column['typecode']).itemsize * column['length']
+            columns[column['name']] = view[column['offset']:column['offset'] + size].cast(column['typecode'])
+        view.release()
+    else:
+        for column in layout:
+            columns[column['name']] = memoryview(array(column['typecode']))
+    return columns
+
+def load_history(filename='rating_history.bin'):
+    """Map a history and its index written by save_history()"""
+    with open(sidecar_filename(filename), encoding='utf-8') as f:
+        sidecar = json.load(f)
+    if sidecar.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported history format version {sidecar.get('version')}")
+    if sidecar['byteorder'] != sys.byteorder:
+        raise ValueError(f"{filename} was written on a {sidecar['byteorder']}-endian machine")
+
+    mappings = []
+    columns = map_columns(filename, sidecar['columns'], mappings)
+    columns.update(map_columns(index_filename(filename), sidecar['index'], mappings))
+    return MappedHistory(filename, sidecar, mappings, columns)
@@ -0,0 +1,269 @@
+"""
+Leaderboards maintained during the rating pass.
+
+YearEndLeaderboards records every fighter's latest rating per year (and
+optionally per division) as bouts are processed, so year-end top-N lists come
+straight from a bounded heap selection instead of a second pass over the
+rating history and a full sort of every year.
+
+LiveLeaderboard keeps everyone's current rating in an indexable skiplist so
+rank-of, top-k and rating-range queries stay logarithmic while results stream in.
+"""
+import heapq
+import itertools
+import random
+from operator import itemgetter
+
+def division_key(split):
+    """
+    Turn a split option into a function of the match row: None for a single
+    leaderboard, a column name such as 'Weight', or a callable.
+    """
+    if split is None:
+        return lambda match: None
+    if callable(split):
+        return split
+    return lambda match: match.get(split, '').strip().upper()
+
+class YearEndLeaderboards:
+    def __init__(self, split=None):
+        self.split = split
+        self.division_of = division_key(split)
+        self.year_ratings = {}  # (year, division) -> {fighter ID: latest rating that year}
+        self._top_cache = {}  # (year, division, n) -> top n list
+
+    def record(self, match, fighter, rating):
+        """Note a fighter's rating after a bout"""
+        key = (match['Year'], self.division_of(match))
+        ratings = self.year_ratings.get(key)
+        if ratings is None:
+            ratings = self.year_ratings[key] = {}
+        ratings[fighter] = rating
+        if self._top_cache:
+            self._invalidate(key)
+
+    def _invalidate(self, key):
+        for cached in [cached for cached in self._top_cache if cached[:2] == key]:
+            del self._top_cache[cached]
+
+    def years(self):
+        return sorted({year for year, division in self.year_ratings})
+
+    def divisions(self, year):
+        return sorted((division for y, division in self.year_ratings if y == year), key=lambda d: (d is not None, d or ''))
+
+    def top(self, year, n=3, division=None):
+        """The n highest (fighter ID, rating) pairs at the end of a year, best first"""
+        cache_key = (year, division, n)
+        top = self._top_cache.get(cache_key)
+        if top is None:
+            ratings = self.year_ratings.get((year, division), {})
+            top = heapq.nlargest(n, ratings.items(), key=itemgetter(1))
+            self._top_cache[cache_key] = top
+        return top
+
+    def to_lists(self):
+        return [[year, division, [[fighter, rating] for fighter, rating in ratings.items()]]
+                for (year, division), ratings in self.year_ratings.items()]
+
+    def load_lists(self, data):
+        self.year_ratings = {(year, division): {fighter: rating for fighter, rating in ratings}
+                             for year, division, ratings in data}
+        self._top_cache = {}
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, next, width):
+        self.key = key
+        self.next = next
+        self.width = width
+
+class _End:
+    """Sentinel key that sorts after every real key"""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return isinstance(other, _End)
+
+    def __gt__(self, other):
+        return not isinstance(other, _End)
+
+    def __ge__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, _End)
+
+    def __hash__(self):
+        return 0
+
+class IndexableSkiplist:
+    """
+    Sorted collection with O(log n) insert, remove, rank (index of a key) and
+    select (key at an index). Each link stores how many level-0 nodes it
+    skips, which is what makes positions cheap to compute.
+    """
+
+    def __init__(self, max_levels=32, seed=0):
+        self.max_levels = max_levels
+        self.levels = 1  # Levels in use; searches start from the highest of these
+        self.size = 0
+        self._random = random.Random(seed)
+        self._nil = _Node(_End(), [], [])
+        self.head = _Node(None, [self._nil] * max_levels, [1] * max_levels)
+
+    def __len__(self):
+        return self.size
+
+    def _level(self):
+        # Geometric distribution: each extra level with probability 1/2
+        bits = self._random.getrandbits(self.max_levels - 1)
+        level = 1
+        while bits & 1:
+            level += 1
+            bits >>= 1
+        return level
+
+    def insert(self, key):
+        levels = self._level()
+        if levels > self.levels:
+            # Head links on unused levels point at the end; bring their widths up to date
+            for level in range(self.levels, levels):
+                self.head.width[level] = self.size + 1
+            self.levels = levels
+        chain = [None] * self.levels
+        steps_at_level = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_node = _Node(key, [None] * levels, [None] * levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """0-based position of key, which must be present"""
+        position = 0
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        if node.next[0].key != key:
+            raise KeyError(key)
+        return position
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node = self.head
+        i += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+    def iter_from(self, key):
+        """Keys >= key in order"""
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                node = node.next[level]
+        node = node.next[0]
+        while node is not self._nil:
+            yield node.key
+            node = node.next[0]
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not self._nil:
+            yield node.key
+            node = node.next[0]
+
+class LiveLeaderboard:
+    """
+    Current ratings of every fighter in rank order, updated on each rating
+    change. Ranks are 1-based, highest rating first; equal ratings are
+    ordered by fighter ID.
+    """
+
+    def __init__(self):
+        self._list = IndexableSkiplist()
+        self._keys = {}  # fighter ID -> key in the skiplist
+
+    def __len__(self):
+        return len(self._list)
+
+    def update(self, fighter, rating):
+        key = self._keys.get(fighter)
+        if key is not None:
+            if key[0] == -rating:
+                return
+            self._list.remove(key)
+        key = (-rating, fighter)
+        self._keys[fighter] = key
+        self._list.insert(key)
+
+    def rank_of(self, fighter):
+        """1-based rank, or None for an unknown fighter"""
+        key = self._keys.get(fighter)
+        if key is None:
+            return None
+        return self._list.index(key) + 1
+
+    def at_rank(self, rank):
+        """(fighter ID, rating) at a 1-based rank"""
+        rating, fighter = self._list[rank - 1]
+        return fighter, -rating
+
+    def iter_ranked(self):
+        """All (fighter ID, rating) pairs, best first"""
+        for rating, fighter in self._list:
+            yield fighter, -rating
+
+    def top(self, k):
+        """The k best (fighter ID, rating) pairs"""
+        return list(itertools.islice(self.iter_ranked(), k))
+
+    def between(self, low, high):
+        """(fighter ID, rating) pairs with low <= rating <= high, best first"""
+        result = []
+        for rating, fighter in self._list.iter_from((-high, -1)):
+            if -rating < low:
+                break
+            result.append((fighter, -rating))
+        return result
@@ -0,0 +1,191 @@
+"""
+Typed binary cache of fighter_matches.csv.
+
+The first run after the CSV changes reads it as usual (read_match_store: one
+canonical row per bout, conflicts set aside) and writes the bouts, sorted by
+(Year, ID), as typed columns: Year and ID as integers, every text column as an
+index into a table of its distinct values (fighter names share one table). The
+columns go to fighter_matches.csv.cache with a JSON sidecar holding the string
+tables, the MatchStore counts and conflicts, and the size, mtime and SHA-1 of
+the CSV.
+
+Later runs map the columns instead of parsing text. The cache is rebuilt when
+the CSV's contents change; a new mtime with the same contents only refreshes
+the sidecar. Rows come back exactly as read_match_store() returns them, as
+CachedMatch dicts that also carry the bout's indexes into shared tables of the
+fighter names and of the results, methods, competitions and stages, normalized
+the way the engine compares them. The engine and the sweep resolve fighter IDs,
+method classes and multipliers once per table entry instead of once per bout
+(the rules and name aliases may change while the CSV doesn't, so that happens
+per run rather than in the cache).
+"""
+import hashlib
+import json
+import os
+import sys
+from array import array
+from collections import namedtuple
+from history_store import map_columns, write_columns
+from match_store import MatchStore, read_match_store
+
+CACHE_VERSION = 2
+
+# Columns whose values share a string table
+SHARED_TABLES = {'Fighter_Name': 'fighters', 'Opponent': 'fighters'}
+# Columns whose table indexes each row carries, in BoutTables order (the fighter table twice)
+CODED_COLUMNS = ('Fighter_Name', 'Opponent', 'W/L', 'Method', 'Competition', 'Stage')
+
+# How the engine normalizes each coded column other than the fighter names
+NORMALIZE = {
+    'W/L': lambda value: value.strip().upper(),
+    'Method': lambda value: value.strip().lower(),
+    'Competition': lambda value: value.strip().lower(),
+    'Stage': lambda value: value.strip().upper(),
+}
+
+# The tables behind CachedMatch.codes, shared by every row of one load: raw
+# fighter names, then the NORMALIZE'd results, methods, competitions and stages
+BoutTables = namedtuple('BoutTables', 'fighters results methods competitions stages')
+
+class CachedMatch(dict):
+    """
+    A match row from the cache. codes holds its indexes into tables for the
+    CODED_COLUMNS: (fighter, opponent, result, method, competition, stage).
+    Copies (dict(row), dict(row, **changes)) are plain rows again.
+    """
+    __slots__ = ('codes', 'tables')
+
+def cache_filename(filename):
+    return filename + '.cache'
+
+def sidecar_filename(filename):
+    return cache_filename(filename) + '.json'
+
+def file_digest(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_info(filename, digest=None):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': digest or file_digest(filename)}
+
+def build_cache(filename='fighter_matches.csv'):
+    """Read the CSV and write its cache; returns the cache sidecar"""
+    source = source_info(filename)
+    store = read_match_store(filename)
+    matches = sorted(store, key=lambda match: (match['Year'], match['ID']))
+    fields = list(matches[0]) if matches else []
+    text_columns = [column for column in fields if column not in ('Year', 'ID')]
+
+    tables = {}  # table name -> {value: index}
+    columns = {'Year': array('i', [match['Year'] for match in matches]),
+               'ID': array('i', [match['ID'] for match in matches])}
+    for column in text_columns:
+        table = tables.setdefault(SHARED_TABLES.get(column, column), {})
+        indexes = array('i')
+        for match in matches:
+            indexes.append(table.setdefault(match[column], len(table)))
+        columns[column] = indexes
+
+    spec = [(column, 'i') for column in columns]
+    layout = write_columns(cache_filename(filename), columns, spec)
+    sidecar = {
+        'version': CACHE_VERSION,
+        'byteorder': sys.byteorder,
+        'source': source,
+        'rows': len(matches),
+        'fields': fields,
+        'columns': layout,
+        'text_columns': {column: SHARED_TABLES.get(column, column) for column in text_columns},
+        'strings': {name: list(table) for name, table in tables.items()},
+        'rows_read': store.rows_read,
+        'mirrored_rows': store.mirrored_rows,
+        'conflicts': store.conflicts,
+    }
+    _write_sidecar(filename, sidecar)
+    return sidecar
+
+def _write_sidecar(filename, sidecar):
+    tmp_filename = sidecar_filename(filename) + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(sidecar, f)
+    os.replace(tmp_filename, sidecar_filename(filename))
+
+def _read_sidecar(filename):
+    try:
+        with open(sidecar_filename(filename), encoding='utf-8') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sidecar.get('version') != CACHE_VERSION or sidecar.get('byteorder') != sys.byteorder:
+        return None
+    return sidecar
+
+def fresh_sidecar(filename):
+    """The cache sidecar if the cache still matches the CSV, else None"""
+    sidecar = _read_sidecar(filename)
+    if sidecar is None or not os.path.exists(cache_filename(filename)):
+        return None
+    stat = os.stat(filename)
+    cached = sidecar['source']
+    if stat.st_size != cached['size']:
+        return None
+    if stat.st_mtime_ns != cached['mtime_ns']:
+        # Touched (e.g. rewritten by the scraper) but maybe not changed
+        digest = file_digest(filename)
+        if digest != cached['sha1']:
+            return None
+        sidecar['source'] = source_info(filename, digest)
+        _write_sidecar(filename, sidecar)
+    return sidecar
+
+def load_cached_rows(filename, sidecar):
+    """Match rows, sorted by (Year, ID), from a fresh cache"""
+    mappings = []
+    columns = map_columns(cache_filename(filename), sidecar['columns'], mappings)
+    try:
+        values = {'Year': columns['Year'].tolist(), 'ID': columns['ID'].tolist()}
+        indexes = {}
+        for column, table in sidecar['text_columns'].items():
+            strings = sidecar['strings'][table]
+            indexes[column] = columns[column].tolist()
+            values[column] = [strings[i] for i in indexes[column]]
+    finally:
+        for column in columns.values():
+            column.release()
+        for mapping in mappings:
+            mapping.close()
+    fields = sidecar['fields']
+    rows = [CachedMatch(zip(fields, row)) for row in zip(*(values[field] for field in fields))]
+
+    text_columns = sidecar['text_columns']
+    if all(column in text_columns for column in CODED_COLUMNS):
+        strings = sidecar['strings']
+        normalized = ([NORMALIZE[column](value) for value in strings[text_columns[column]]] for column in CODED_COLUMNS[2:])
+        tables = BoutTables(strings[text_columns['Fighter_Name']], *normalized)
+        for row, codes in zip(rows, zip(*(indexes[column] for column in CODED_COLUMNS))):
+            row.codes = codes
+            row.tables = tables
+    return rows
+
+def load_match_store(filename='fighter_matches.csv', use_cache=True):
+    """
+    read_match_store() through the binary cache: maps the cache if it matches the CSV,
+    otherwise reads the CSV and rebuilds the cache.
+    """
+    if not use_cache:
+        return read_match_store(filename)
+    sidecar = fresh_sidecar(filename)
+    if sidecar is None:
+        sidecar = build_cache(filename)
+
+    store = MatchStore()
+    store.matches = {match['ID']: match for match in load_cached_rows(filename, sidecar)}
+    store.rows_read = sidecar['rows_read']
+    store.mirrored_rows = sidecar['mirrored_rows']
+    store.conflicts = [tuple(pair) for pair in sidecar['conflicts']]
+    store.conflicted_ids = {row['ID'] for row, _ in store.conflicts}
+    return store
@@ -0,0 +1,123 @@
+"""
+Streaming writer for fighter_matches.csv.
+
+Rows are appended as each fighter's page is parsed, under a fixed column
+order, so memory is bounded by one page. finalize() sorts the rows by
+fighter name with an external merge sort (sorted runs on disk, merged with
+heapq.merge) and moves the result into place.
+"""
+import csv
+import heapq
+import os
+import tempfile
+
+MATCH_COLUMNS = ['Fighter_Name', 'Fighter_URL', 'W/L', 'Opponent', 'Stage', 'Weight', 'ID', 'Competition', 'Method', 'Year']
+
+# Rows per sorted run during finalize()
+SORT_CHUNK_ROWS = 50000
+
+def fighter_sort_key(row):
+    return row['Fighter_Name'].lower()
+
+class MatchCsvWriter:
+    """
+    Writes to filename + '.part' and only replaces filename on finalize(), so an
+    interrupted crawl never clobbers the previous export.
+    """
+
+    def __init__(self, filename='fighter_matches.csv'):
+        self.filename = filename
+        self.part_filename = filename + '.part'
+        self.rows = 0
+        self.fighters = 0
+        self.unknown_columns = set()
+        self._file = open(self.part_filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=MATCH_COLUMNS, extrasaction='ignore', restval='')
+        self._writer.writeheader()
+
+    def write_fighter(self, fighter_data):
+        """Append every match of one fighter"""
+        for match in fighter_data['matches']:
+            row = dict(match)
+            row['Fighter_Name'] = fighter_data['name']
+            row['Fighter_URL'] = fighter_data['url']
+            self.write_row(row)
+        self.fighters += 1
+        self._file.flush()
+
+    def write_row(self, row):
+        if len(row) > len(MATCH_COLUMNS) or any(column not in row for column in MATCH_COLUMNS):
+            new_columns = set(row) - set(MATCH_COLUMNS) - self.unknown_columns
+            if new_columns:
+                print(f"Ignoring columns not in the fixed schema: {', '.join(sorted(new_columns))}")
+                self.unknown_columns |= new_columns
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def finalize(self, sort=True, chunk_rows=SORT_CHUNK_ROWS):
+        """Close the stream, optionally sort it by fighter name, and move it to filename"""
+        self.close()
+        if sort:
+            sort_matches_csv(self.part_filename, chunk_rows)
+        os.replace(self.part_filename, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _write_run(rows, directory):
+    rows.sort(key=fighter_sort_key)  # Stable, so each fighter's rows keep their order
+    run = tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8', dir=directory, suffix='.run', delete=False)
+    with run:
+        writer = csv.DictWriter(run, fieldnames=MATCH_COLUMNS)
+        writer.writerows(rows)
+    return run.name
+
+def sort_matches_csv(filename, chunk_rows=SORT_CHUNK_ROWS):
+    """Sort a matches CSV by fighter name in place, holding at most chunk_rows rows in memory"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    runs = []
+    try:
+        with open(filename, newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    runs.append(_write_run(chunk, directory))
+                    chunk = []
+            if chunk or not runs:
+                runs.append(_write_run(chunk, directory))
+
+        run_files = [open(run, newline='', encoding='utf-8') for run in runs]
+        try:
+            readers = [csv.DictReader(run_file, fieldnames=MATCH_COLUMNS) for run_file in run_files]
+            sorted_filename = filename + '.sorted'
+            with open(sorted_filename, 'w', newline='', encoding='utf-8') as out:
+                writer = csv.DictWriter(out, fieldnames=MATCH_COLUMNS)
+                writer.writeheader()
+                # heapq.merge prefers earlier runs on ties, so the sort stays stable
+                writer.writerows(heapq.merge(*readers, key=fighter_sort_key))
+        finally:
+            for run_file in run_files:
+                run_file.close()
+        os.replace(sorted_filename, filename)
+    finally:
+        for run in runs:
+            os.remove(run)
+
+def copy_matches_except(filename, writer, skip_fighter_urls):
+    """Stream the rows of an earlier export into writer, leaving out some fighters"""
+    copied = 0
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            if row['Fighter_URL'] not in skip_fighter_urls:
+                writer.write_row(row)
+                copied += 1
+    return copied
@@ -0,0 +1,100 @@
+"""
+One row per bout. fighter_matches.csv lists most bouts twice, once from each
+fighter's page, with the same ID. MatchStore keeps a single canonical row per
+ID and reports mirrored rows whose results do not agree.
+"""
+import csv
+
+# The result the other fighter's page should show for the same bout
+MIRRORED_RESULT = {'W': 'L', 'L': 'W', 'D': 'D'}
+
+def normalized_result(row):
+    return row.get('W/L', '').strip().upper()
+
+class MatchStore:
+    def __init__(self):
+        self.matches = {}  # ID -> canonical row
+        self.conflicts = []  # (row kept out, row it conflicts with)
+        self.conflicted_ids = set()
+        self.rows_read = 0
+        self.mirrored_rows = 0
+
+    def add(self, row):
+        """Add a match row. Returns True if it is the first row seen for its bout."""
+        self.rows_read += 1
+        match_id = row['ID']
+        if match_id in self.conflicted_ids:
+            return False
+        existing = self.matches.get(match_id)
+        if existing is None:
+            self.matches[match_id] = row
+            return True
+        self.mirrored_rows += 1
+        self.reconcile(existing, row)
+        return False
+
+    def reconcile(self, existing, row):
+        """Pick the canonical row for a bout that was listed twice"""
+        match_id = row['ID']
+        result = normalized_result(row)
+        existing_result = normalized_result(existing)
+
+        if existing_result not in MIRRORED_RESULT:
+            # The first copy had no usable result, take the second one
+            if result in MIRRORED_RESULT:
+                self.matches[match_id] = row
+            return
+        if result not in MIRRORED_RESULT:
+            return
+
+        if row.get('Fighter_URL') == existing.get('Fighter_URL'):
+            # Same page listed the bout twice, both copies should say the same
+            consistent = result == existing_result
+        else:
+            consistent = result == MIRRORED_RESULT[existing_result]
+        if not consistent or row['Year'] != existing['Year']:
+            # We can't tell which copy is right, so leave the bout out of the ratings
+            self.conflicts.append((row, existing))
+            self.conflicted_ids.add(match_id)
+            del self.matches[match_id]
+            return
+
+        # Keep the winner's side: the method and competition multipliers are
+        # applied from the fighter's point of view
+        if result == 'W':
+            self.matches[match_id] = row
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __iter__(self):
+        return iter(self.matches.values())
+
+    def report(self):
+        print(f"Read {self.rows_read} rows: {len(self.matches)} bouts, "
+              f"{self.mirrored_rows} mirrored rows merged, {len(self.conflicts)} conflicting bouts dropped")
+        for row, existing in self.conflicts:
+            print(f"  Conflict in bout {row['ID']}: "
+                  f"{existing['Fighter_Name']} {normalized_result(existing)} ({existing['Year']}) vs "
+                  f"{row['Fighter_Name']} {normalized_result(row)} ({row['Year']})")
+
+    def write_conflicts(self, filename='match_conflicts.csv'):
+        """Write both rows of every conflicting bout to a CSV for manual review"""
+        fieldnames = ['ID', 'Year', 'Fighter_Name', 'Fighter_URL', 'Opponent', 'W/L', 'Competition', 'Stage', 'Method']
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for row, existing in self.conflicts:
+                writer.writerow(existing)
+                writer.writerow(row)
+
+def read_match_store(filename='fighter_matches.csv'):
+    """Read match rows into a MatchStore, with Year and ID converted to integers for sorting"""
+    store = MatchStore()
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            row['Year'] = int(row['Year'])
+            row['ID'] = int(row['ID'])
+            store.add(row)
+    return store
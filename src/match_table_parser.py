@@ -0,0 +1,265 @@
+"""
+Fast extraction of the two things the scraper needs from a fighter page: the
+<title> text and the first <table>. Instead of building a full BeautifulSoup
+tree, an event-based html.parser subclass collects just those and stops as
+soon as the table is closed.
+
+The output mirrors what parse_fighter_page got from BeautifulSoup: header
+texts from every th/td in the table's first row, and for each later row the
+texts of its td cells, each one joined from its stripped text pieces like
+get_text(strip=True). Open elements are tracked on a stack the way the
+BeautifulSoup tree builder does it, so malformed markup nests the same way: an
+end tag closes every element opened after the most recent open element of its
+name and is ignored if there is none, unclosed cells stay open until their row
+(or whatever encloses them) closes, and void elements like <br> never hold text.
+
+Run as a script to compare it against the BeautifulSoup parser on saved
+pages, e.g. the bodies in the page cache:
+
+    python match_table_parser.py page_cache/
+"""
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+import json
+import os
+import sys
+
+# Text inside these never shows up in get_text()
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+# Elements BeautifulSoup closes as soon as they open
+VOID_ELEMENTS = {
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+    'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+}
+# Stack roles of the first <title> and the first <table>
+_TITLE = 'title'
+_TABLE = 'table'
+
+class _StopParsing(Exception):
+    pass
+
+class _Cell:
+    __slots__ = ('tag', 'parts')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.parts = []
+
+    def text(self):
+        return ''.join(self.parts)
+
+class MatchTableExtractor(HTMLParser):
+    def __init__(self):
+        # References are resolved in handle_entityref/handle_charref, the way BeautifulSoup does it
+        super().__init__(convert_charrefs=False)
+        self.title = None  # Text of the first <title>, None if there is none
+        self.rows = []  # Each row: list of its th/td cells, in document order
+        self._title_parts = None
+        self._in_table = False
+        self._table_done = False
+        self._stack = []  # Open elements as (tag, role): _TITLE, _TABLE, a row, a _Cell or None
+        self._open_tags = {}  # tag -> open elements with that name
+        self._open_rows = []
+        self._open_cells = []
+        self._skip_depth = 0
+        self._pending = []  # Text seen since the last tag, joined into one string like BeautifulSoup does
+
+    # Text handling
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_entityref(self, name):
+        # Unknown names stay literal, without the semicolon
+        self._pending.append(html5.get(name + ';', '&' + name))
+
+    def handle_charref(self, name):
+        self._pending.append(unescape(f'&#{name};'))
+
+    def _flush(self, cdata=False):
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self._pending = []
+        # CDATA keeps its own string type, so it shows up even inside skipped elements
+        if self._skip_depth and not cdata:
+            return
+        if self._title_parts is not None:
+            self._title_parts.append(text)
+        if self._open_cells:
+            stripped = text.strip()
+            if stripped:
+                # A cell's text includes the text of any cells nested in it
+                for cell in self._open_cells:
+                    cell.parts.append(stripped)
+
+    # Tags
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in VOID_ELEMENTS:
+            return
+        role = None
+        if tag in SKIPPED_TEXT_TAGS:
+            self._skip_depth += 1
+        elif tag == 'title':
+            if self.title is None and self._title_parts is None:
+                self._title_parts = []
+                role = _TITLE
+        elif self._table_done:
+            pass
+        elif tag == 'table':
+            if not self._in_table:
+                self._in_table = True
+                role = _TABLE
+        elif not self._in_table:
+            pass
+        elif tag == 'tr':
+            role = []
+            self.rows.append(role)
+            self._open_rows.append(role)
+        elif tag in ('td', 'th'):
+            role = _Cell(tag)
+            # find_all() on a row also finds cells of rows nested in it
+            for row in self._open_rows:
+                row.append(role)
+            self._open_cells.append(role)
+        self._stack.append((tag, role))
+        self._open_tags[tag] = self._open_tags.get(tag, 0) + 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if not self._open_tags.get(tag):
+            return
+        while True:
+            name, role = self._stack.pop()
+            self._open_tags[name] -= 1
+            self._close(name, role)
+            if name == tag:
+                break
+        if self._table_done and self.title is not None:
+            raise _StopParsing()
+
+    def _close(self, tag, role):
+        if tag in SKIPPED_TEXT_TAGS:
+            self._skip_depth -= 1
+        elif role is None:
+            return
+        elif role is _TITLE:
+            self.title = ''.join(self._title_parts)
+            self._title_parts = None
+        elif role is _TABLE:
+            self._in_table = False
+            self._table_done = True
+        elif tag == 'tr':
+            self._open_rows.pop()
+        else:
+            self._open_cells.pop()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            # CDATA is text of its own, separate from what surrounds it
+            self._pending.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    def extract(self, html):
+        try:
+            self.feed(html)
+            self.close()
+            # Whatever the parser could not make sense of arrives as trailing text
+            self._flush()
+        except _StopParsing:
+            pass
+        if self._title_parts is not None:
+            # Unclosed <title>: BeautifulSoup still keeps what was read
+            self._flush()
+            self.title = ''.join(self._title_parts)
+        return self
+
+def extract_fighter_page(html):
+    """(title text or None, header texts, [cell texts of each data row]) for a fighter page, or None without a table"""
+    extractor = MatchTableExtractor().extract(html)
+    if not extractor._table_done and not extractor._in_table:
+        return extractor.title, None, None
+    rows = extractor.rows
+    headers = [cell.text() for cell in rows[0]] if rows else []
+    data_rows = [[cell.text() for cell in row if cell.tag == 'td'] for row in rows[1:]]
+    return extractor.title, headers, data_rows
+
+def parse_fighter_page_fast(html, fighter_url):
+    """Same result as parse_fighter_page, without building a BeautifulSoup tree"""
+    title_text, headers, data_rows = extract_fighter_page(html)
+
+    # Extract fighter name from the page
+    fighter_name = "Unknown"
+    if title_text is not None:
+        # Try to extract name from title
+        if 'BJJ Heroes' in title_text:
+            name_part = title_text.split('BJJ Heroes')[0].strip()
+            if name_part:
+                fighter_name = name_part
+
+    # No matches table
+    if headers is None:
+        return None
+
+    if data_rows:
+        fighter_data = {
+            'name': fighter_name,
+            'url': fighter_url,
+            'matches': []
+        }
+
+        for cells in data_rows:
+            if len(cells) >= len(headers):
+                match_data = {}
+
+                # Map data to headers
+                for i, header in enumerate(headers):
+                    if i < len(cells):
+                        match_data[header] = cells[i]
+
+                if match_data:  # Only add non-empty matches
+                    fighter_data['matches'].append(match_data)
+
+        return fighter_data if fighter_data['matches'] else None
+    return None
+
+def iter_saved_pages(path):
+    """(name, html) for .html files and page cache entries under path"""
+    names = [path] if os.path.isfile(path) else sorted(os.path.join(path, name) for name in os.listdir(path))
+    for name in names:
+        if name.endswith('.json'):
+            with open(name, encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('body'):
+                yield entry.get('key', name), entry['body']
+        elif name.endswith(('.html', '.htm')):
+            with open(name, encoding='utf-8') as f:
+                yield name, f.read()
+
+def main(paths):
+    from sitemap_scraper import parse_fighter_page_bs4
+    checked = mismatched = 0
+    for path in paths:
+        for name, html in iter_saved_pages(path):
+            checked += 1
+            if parse_fighter_page_fast(html, name) != parse_fighter_page_bs4(html, name):
+                mismatched += 1
+                print(f"Mismatch: {name}")
+    print(f"Compared {checked} pages, {mismatched} mismatches")
+    return 1 if mismatched else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or ['page_cache']))
@@ -0,0 +1,115 @@
+"""
+Stage timers and counters for the scraper and the Elo calculator.
+
+Code records into the process-wide METRICS registry:
+
+    with METRICS.timer('load'):
+        ...
+    METRICS.inc('http_responses', status=200)
+
+and the script writes everything out once at exit with METRICS.dump(), as
+JSON, or in the Prometheus text format when the file name ends in .prom (for
+node_exporter's textfile collector). A stage can also be run under cProfile by
+naming it in METRICS.profile(), without touching the code that times it.
+"""
+import cProfile
+import contextlib
+import json
+import os
+import time
+
+class Metrics:
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.timers = {}  # stage -> [seconds, calls]
+        self.counters = {}  # (name, ((label, value), ...)) -> count
+        self.gauges = {}  # Same keys -> last value
+        self.profiled = {}  # stage -> file for its cProfile stats
+
+    def reset(self, prefix=None):
+        if prefix is not None:
+            self.prefix = prefix
+        self.timers.clear()
+        self.counters.clear()
+        self.gauges.clear()
+        self.profiled.clear()
+
+    def add_time(self, stage, seconds, calls=1):
+        timer = self.timers.setdefault(stage, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += calls
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Time a block as one call of stage; runs it under cProfile if the stage is profiled"""
+        profiler = cProfile.Profile() if stage in self.profiled else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profiled[stage])
+            self.add_time(stage, time.perf_counter() - start)
+
+    def profile(self, stage, filename):
+        """Write cProfile stats of the next timer(stage) block to filename (read them with pstats or snakeviz)"""
+        self.profiled[stage] = filename
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def to_dict(self):
+        def entries(values):
+            return [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(values.items(), key=str)]
+        return {
+            'prefix': self.prefix,
+            'timestamp': time.time(),
+            'stages': {stage: {'seconds': round(seconds, 6), 'calls': calls} for stage, (seconds, calls) in self.timers.items()},
+            'counters': entries(self.counters),
+            'gauges': entries(self.gauges),
+        }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        prefix = self.prefix + '_' if self.prefix else ''
+        lines = []
+
+        def family(name, kind, samples):
+            lines.append(f"# TYPE {prefix}{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+                lines.append(f"{prefix}{name}{{{label_text}}} {value}" if label_text else f"{prefix}{name} {value}")
+
+        if self.timers:
+            family('stage_seconds_total', 'counter', [((('stage', stage),), f"{seconds:.6f}") for stage, (seconds, _) in self.timers.items()])
+            family('stage_calls_total', 'counter', [((('stage', stage),), calls) for stage, (_, calls) in self.timers.items()])
+        for kind, values, suffix in (('counter', self.counters, '_total'), ('gauge', self.gauges, '')):
+            by_name = {}
+            for (name, labels), value in values.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name, samples in sorted(by_name.items()):
+                family(name + suffix, kind, sorted(samples, key=str))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, filename):
+        """Write the metrics to filename: Prometheus text for .prom files, JSON otherwise"""
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            if filename.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+        # Collectors may read the file at any time, so never leave it half-written
+        os.replace(tmp_filename, filename)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+METRICS = Metrics()
@@ -0,0 +1,139 @@
+"""
+Rating multipliers for win method, competition and stage, driven by a rules
+table (multiplier_rules.json by default) instead of code.
+
+Keyword lists are compiled once into a single regex, and every resolved value
+is cached per distinct string, since only a few hundred distinct competitions
+and methods occur. Resolving a bout's multipliers is then a few dict lookups.
+
+Rules file keys:
+  method_classes          keyword in the (lowercase) method -> method class, first listed wins
+  default_method_class    class of methods that match no keyword
+  method_multipliers      winner's multiplier per method class
+  event_multipliers       winner's multiplier per competition keyword, first listed wins
+  major_events            competition keywords that use major_stage_multipliers
+  major_stage_multipliers multiplier per stage (F, SF, QF, ...) at major events
+  stage_multipliers       multiplier per stage everywhere else; unlisted stages are 1.0
+"""
+import hashlib
+import json
+import os
+import re
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'multiplier_rules.json')
+
+class KeywordMatcher:
+    """Finds which of a list of keywords occurs in a string, giving priority to the first listed"""
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._priority = {}
+        for i, keyword in enumerate(self.keywords):
+            self._priority.setdefault(keyword, i)
+        # A lookahead finds every (possibly overlapping) occurrence in one scan
+        alternation = '|'.join(re.escape(keyword) for keyword in self._priority)
+        self._pattern = re.compile(f'(?=({alternation}))') if self.keywords else None
+        self._cache = {}
+
+    def first(self, text):
+        """Index of the first listed keyword that occurs in text, or -1"""
+        found = self._cache.get(text)
+        if found is None:
+            found = -1
+            if self._pattern is not None:
+                for match in self._pattern.finditer(text):
+                    i = self._priority[match.group(1)]
+                    if found < 0 or i < found:
+                        found = i
+            self._cache[text] = found
+        return found
+
+class MultiplierRules:
+    def __init__(self, method_classes, default_method_class, method_multipliers, event_multipliers,
+                 major_events, major_stage_multipliers, stage_multipliers):
+        self.method_classes = dict(method_classes)
+        self.default_method_class = default_method_class
+        self.method_multipliers = dict(method_multipliers)
+        self.event_multipliers = dict(event_multipliers)
+        self.major_events = list(major_events)
+        self.major_stage_multipliers = dict(major_stage_multipliers)
+        self.stage_multipliers = dict(stage_multipliers)
+        missing = set(self.method_classes.values()) | {default_method_class}
+        missing -= set(self.method_multipliers)
+        if missing:
+            raise ValueError(f"No method multiplier for method classes {sorted(missing)}")
+
+        self._method_matcher = KeywordMatcher(self.method_classes)
+        self._event_matcher = KeywordMatcher(self.event_multipliers)
+        self._event_values = list(self.event_multipliers.values())
+        self._major_matcher = KeywordMatcher(self.major_events)
+        self._method_cache = {}
+        self._stage_cache = {}
+
+    @classmethod
+    def from_dict(cls, rules):
+        return cls(rules['method_classes'], rules['default_method_class'], rules['method_multipliers'],
+                   rules['event_multipliers'], rules['major_events'], rules['major_stage_multipliers'],
+                   rules['stage_multipliers'])
+
+    def to_dict(self):
+        return {
+            'method_classes': self.method_classes,
+            'default_method_class': self.default_method_class,
+            'method_multipliers': self.method_multipliers,
+            'event_multipliers': self.event_multipliers,
+            'major_events': self.major_events,
+            'major_stage_multipliers': self.major_stage_multipliers,
+            'stage_multipliers': self.stage_multipliers,
+        }
+
+    def fingerprint(self):
+        """Digest of the rules; ratings (and checkpoints) depend on it"""
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode('utf-8')).hexdigest()
+
+    def with_multipliers(self, method_multipliers=None, event_multipliers=None):
+        """Copy of the rules with the method and/or event multipliers replaced"""
+        if method_multipliers is None and event_multipliers is None:
+            return self
+        rules = self.to_dict()
+        if method_multipliers is not None:
+            rules['method_multipliers'] = method_multipliers
+        if event_multipliers is not None:
+            rules['event_multipliers'] = event_multipliers
+        return MultiplierRules.from_dict(rules)
+
+    def method_class(self, method):
+        """Which method_multipliers entry a (lowercase) win method falls under"""
+        found = self._method_cache.get(method)
+        if found is None:
+            i = self._method_matcher.first(method)
+            found = self.method_classes[self._method_matcher.keywords[i]] if i >= 0 else self.default_method_class
+            self._method_cache[method] = found
+        return found
+
+    def method_multiplier(self, method, result):
+        """Multiplier for the winner's rating change; losses and draws are always 1.0"""
+        if result != 'W':
+            return 1.0
+        return self.method_multipliers[self.method_class(method)]
+
+    def event_multiplier(self, competition, result):
+        """Winner's multiplier for a (lowercase) competition, 1.0 for everyone else"""
+        if result != 'W':
+            return 1.0
+        i = self._event_matcher.first(competition)
+        return self._event_values[i] if i >= 0 else 1.0
+
+    def stage_multiplier(self, competition, stage):
+        """Multiplier for a (lowercase) competition and (uppercase) stage"""
+        key = (competition, stage)
+        found = self._stage_cache.get(key)
+        if found is None:
+            stages = self.major_stage_multipliers if self._major_matcher.first(competition) >= 0 else self.stage_multipliers
+            found = stages.get(stage, 1.0)
+            self._stage_cache[key] = found
+        return found
+
+def load_rules(filename=RULES_FILE):
+    with open(filename, encoding='utf-8') as f:
+        return MultiplierRules.from_dict(json.load(f))
@@ -0,0 +1,75 @@
+"""
+On-disk cache of fighter pages for conditional requests.
+
+Each fighter URL gets one JSON file holding the validators the server sent
+(ETag, Last-Modified), the sitemap <lastmod> seen when it was fetched, the
+page body and the parsed fighter data. A later crawl can then skip fighters
+whose <lastmod> has not moved, send If-None-Match / If-Modified-Since for the
+rest, and reuse the parsed data on a 304 without parsing the page again.
+"""
+import hashlib
+import json
+import os
+import time
+
+class PageCache:
+    def __init__(self, directory='page_cache'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def get(self, key):
+        """Cached entry for a fighter URL, or None"""
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return None  # A damaged entry is just a cache miss
+        return entry if entry.get('key') == key else None
+
+    def put(self, key, etag=None, last_modified=None, sitemap_lastmod=None, body=None, parsed=None):
+        entry = {
+            'key': key,
+            'etag': etag,
+            'last_modified': last_modified,
+            'sitemap_lastmod': sitemap_lastmod,
+            'fetched_at': time.time(),
+            'body': body,
+            'parsed': parsed,
+        }
+        self._write(key, entry)
+        return entry
+
+    def touch(self, entry, sitemap_lastmod=None):
+        """Record that a cached page was confirmed unchanged (e.g. by a 304)"""
+        entry['fetched_at'] = time.time()
+        if sitemap_lastmod is not None:
+            entry['sitemap_lastmod'] = sitemap_lastmod
+        self._write(entry['key'], entry)
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for a cached entry"""
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def is_fresh(entry, sitemap_lastmod):
+    """True if the sitemap says the page has not changed since it was cached"""
+    return entry is not None and sitemap_lastmod is not None and entry.get('sitemap_lastmod') == sitemap_lastmod
@@ -0,0 +1,266 @@
+"""
+Rating independent parts of the match stream in a process pool.
+
+A bout only touches the state of its two fighters, so fighters who are never
+linked by a chain of bouts (different connected components of the fighter
+graph) can be rated separately. rate_components() packs the components into
+one chunk per worker, rates each chunk with its own EloEngine in a process
+pool and merges the results into the caller's engine: fighter IDs in order of
+first appearance, the rating history and the year-end leaderboards in bout
+order. The result is identical to rating the bouts serially. With a single
+component (or a single worker) it simply rates the bouts in this process.
+
+rate_divisions() instead rates each user-declared division (e.g. the Weight
+column) as a league of its own, with separate ratings per division.
+
+Run as a script to check the parallel result against the serial one:
+
+    python parallel_rating.py --workers 4 --verify
+    python parallel_rating.py --divisions Weight --verify
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from elo_engine import EloEngine, match_key
+from elo_sinks import MIN_MATCHES
+from fighter_names import current_aliases, fighter_key, use_aliases
+from leaderboards import division_key
+from match_cache import load_match_store
+from multiplier_rules import MultiplierRules
+
+def fighter_components(matches):
+    """Lists of bout indices, one per connected component of the fighter graph, largest first"""
+    parent = {}
+
+    def find(fighter):
+        root = parent.setdefault(fighter, fighter)
+        while root != parent[root]:
+            parent[root] = parent[parent[root]]  # Path halving
+            root = parent[root]
+        return root
+
+    for match in matches:
+        a, b = find(fighter_key(match['Fighter_Name'])), find(fighter_key(match['Opponent']))
+        if a != b:
+            parent[a] = b
+    components = {}
+    for i, match in enumerate(matches):
+        components.setdefault(find(fighter_key(match['Fighter_Name'])), []).append(i)
+    # Ties keep the order of first appearance, so the packing below is deterministic
+    return sorted(components.values(), key=len, reverse=True)
+
+def pack_components(components, workers):
+    """Spread components over at most `workers` chunks of about equal bout counts; each chunk's indices sorted"""
+    chunks = [[] for _ in range(max(1, workers))]
+    sizes = [0] * len(chunks)
+    for component in components:
+        smallest = sizes.index(min(sizes))
+        chunks[smallest].extend(component)
+        sizes[smallest] += len(component)
+    return [sorted(chunk) for chunk in chunks if chunk]
+
+def engine_options(engine):
+    """Keyword arguments that rebuild an engine with the same parameters in another process"""
+    return {
+        'initial_rating': engine.initial_rating,
+        'k_new': engine.k_new,
+        'k_established': engine.k_established,
+        'provisional_matches': engine.provisional_matches,
+        'rules': engine.rules.to_dict(),
+        'decay_rate': engine.decay_rate,
+        'decay_grace': engine.decay_grace,
+        'system': engine.system,
+    }
+
+def _new_engine(options, **extra):
+    options = dict(options, rules=MultiplierRules.from_dict(options['rules']))
+    return EloEngine(**options, **extra)
+
+def _rate_chunk(options, matches):
+    """Rate one chunk of bouts (already in order) and return its state as plain arrays"""
+    engine = _new_engine(options, checkpoint_every=None)
+    rated = bytearray(len(matches))
+    for i, match in enumerate(matches):
+        rated[i] = engine.process(match)
+
+    # Where each fighter first appeared, as 2 * bout + side; IDs are handed out in this order
+    first_seen = []
+    raw_ids = engine._raw_ids
+    for i, match in enumerate(matches):
+        for side, name in enumerate((match['Fighter_Name'], match['Opponent'])):
+            if raw_ids[name] == len(first_seen):
+                first_seen.append(2 * i + side)
+        if len(first_seen) == len(engine.names):
+            break
+
+    history = engine.rating_history
+    return {
+        'names': engine.names,
+        'keys': engine.keys,
+        'first_seen': first_seen,
+        'ratings': engine.ratings,
+        'match_counts': engine.match_counts,
+        'peak_ratings': engine.peak_ratings,
+        'peak_years': engine.peak_years,
+        'last_years': engine.last_years,
+        'system_state': engine.system_state,
+        'rated': rated,
+        'history': (history.fighters, history.years, history.match_ids, history.ratings),
+    }
+
+def _merge_chunks(engine, matches, chunks, results):
+    """Fill an empty engine from rated chunks exactly as process() would have, bout by bout"""
+    # Global IDs in order of first appearance across all chunks
+    firsts = sorted((2 * chunk[position // 2] + position % 2, c, local)
+                    for c, (chunk, result) in enumerate(zip(chunks, results))
+                    for local, position in enumerate(result['first_seen']))
+    ids = [[0] * len(result['names']) for result in results]
+    for _, c, local in firsts:
+        result = results[c]
+        fighter = engine._add_fighter(result['keys'][local], result['names'][local])
+        ids[c][local] = fighter
+        engine.ratings[fighter] = result['ratings'][local]
+        engine.match_counts[fighter] = result['match_counts'][local]
+        engine.peak_ratings[fighter] = result['peak_ratings'][local]
+        engine.peak_years[fighter] = result['peak_years'][local]
+        engine.last_years[fighter] = result['last_years'][local]
+        for field, values in result['system_state'].items():
+            engine.system_state[field][fighter] = values[local]
+
+    # Walk the bouts in order, taking each rated bout's two history rows from its chunk
+    chunk_of = [0] * len(matches)
+    for c, chunk in enumerate(chunks):
+        for i in chunk:
+            chunk_of[i] = c
+    bout_cursor = [0] * len(chunks)
+    row_cursor = [0] * len(chunks)
+    history = engine.rating_history
+    year_end = engine.year_end
+    rated = 0
+    for i, match in enumerate(matches):
+        c = chunk_of[i]
+        result = results[c]
+        bout = bout_cursor[c]
+        bout_cursor[c] = bout + 1
+        if not result['rated'][bout]:
+            continue
+        rated += 1
+        fighters, years, match_ids, ratings = result['history']
+        first_row = row_cursor[c]
+        row_cursor[c] = first_row + 2
+        for row in (first_row, first_row + 1):
+            fighter = ids[c][fighters[row]]
+            history.append(fighter, years[row], match_ids[row], ratings[row])
+            year_end.record(match, fighter, ratings[row])
+
+    engine.processed = list(matches)
+    engine.rows_processed = len(matches)
+    engine.last_key = match_key(matches[-1]) if matches else None
+    # Checkpoints for as_of() are rebuilt by replay when first needed, as after restore()
+    engine._checkpoints_from = engine.rows_processed
+    return rated
+
+def rate_components(engine, matches, workers=None):
+    """
+    Rate bouts sorted by match_key into an empty engine, one process per chunk of
+    fighter components. Returns the number of bouts rated, like process_many().
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = pack_components(fighter_components(matches), workers) if workers > 1 else []
+    if len(chunks) < 2:
+        return engine.process_many(matches)
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=use_aliases, initargs=(current_aliases(),)) as pool:
+        results = list(pool.map(_rate_chunk, repeat(engine_options(engine)),
+                                ([matches[i] for i in chunk] for chunk in chunks)))
+    return _merge_chunks(engine, matches, chunks, results)
+
+def _rate_division(options, matches):
+    engine = _new_engine(options)
+    engine.update(matches)
+    return engine.snapshot()
+
+def rate_divisions(matches, split, workers=None, engine=None):
+    """
+    {division: EloEngine} with every division rated on its own, in a process pool.
+    split is a match column such as 'Weight' or a function of the match row; engine
+    supplies the rating parameters (default: a plain EloEngine). Divisions are sorted.
+    """
+    options = engine_options(engine or EloEngine())
+    division_of = division_key(split)
+    divisions = {}
+    for match in matches:
+        divisions.setdefault(division_of(match), []).append(match)
+    names = sorted(divisions, key=lambda d: (d is not None, d or ''))
+    workers = min(workers or os.cpu_count() or 1, len(names))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_aliases, initargs=(current_aliases(),)) as pool:
+            snapshots = list(pool.map(_rate_division, repeat(options), (divisions[name] for name in names)))
+    else:
+        snapshots = [_rate_division(options, divisions[name]) for name in names]
+
+    engines = {}
+    for name, snapshot in zip(names, snapshots):
+        engines[name] = _new_engine(options)
+        engines[name].restore(snapshot)
+    return engines
+
+def write_division_ratings(engines, filename='division_ratings.csv', min_matches=MIN_MATCHES):
+    """Current and peak rating per fighter per division, best first within each division"""
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=['Division', 'Fighter', 'Current_Elo', 'Peak_Elo', 'Matches'])
+        writer.writeheader()
+        for division, engine in engines.items():
+            for fighter, rating in engine.live_leaderboard().iter_ranked():
+                if engine.match_counts[fighter] < min_matches:
+                    continue
+                writer.writerow({
+                    'Division': division,
+                    'Fighter': engine.names[fighter],
+                    'Current_Elo': round(rating, 2),
+                    'Peak_Elo': round(engine.peak_ratings[fighter], 2),
+                    'Matches': engine.match_counts[fighter],
+                })
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate independent parts of fighter_matches.csv in parallel')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: %(default)s)')
+    parser.add_argument('--divisions', metavar='COLUMN', help='rate each value of a match column separately, e.g. Weight')
+    parser.add_argument('--matches', default='fighter_matches.csv')
+    parser.add_argument('--out', default='division_ratings.csv', help='ratings per division (default: %(default)s)')
+    parser.add_argument('--verify', action='store_true', help='also rate serially and check that the results are identical')
+    args = parser.parse_args()
+
+    matches = sorted(load_match_store(args.matches), key=match_key)
+    if args.divisions:
+        start = time.perf_counter()
+        engines = rate_divisions(matches, args.divisions, args.workers)
+        print(f"Rated {len(engines)} divisions by {args.divisions} in {time.perf_counter() - start:.2f}s with {args.workers} workers")
+        write_division_ratings(engines, args.out)
+        print(f"Division ratings saved to {args.out}")
+        if args.verify:
+            serial = rate_divisions(matches, args.divisions, workers=1)
+            mismatched = [division for division in engines if engines[division].snapshot() != serial[division].snapshot()]
+            print(f"Compared {len(engines)} divisions with the serial path, {len(mismatched)} mismatches")
+            return 1 if mismatched else 0
+        return 0
+
+    components = fighter_components(matches)
+    print(f"{len(matches)} bouts in {len(components)} fighter components, the largest holds {len(components[0]) if components else 0}")
+    start = time.perf_counter()
+    engine = EloEngine()
+    rate_components(engine, matches, args.workers)
+    print(f"Rated in {time.perf_counter() - start:.2f}s with {args.workers} workers")
+    if args.verify:
+        serial = EloEngine()
+        serial.process_many(matches)
+        same = engine.snapshot() == serial.snapshot()
+        print("Identical to the serial path" if same else "Differs from the serial path")
+        return 0 if same else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
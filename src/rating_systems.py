@@ -0,0 +1,305 @@
+"""
+Rating systems compared on the same match stream.
+
+Bouts are grouped into rating periods (every bout, every event or every year).
+All bouts of a period are predicted from the ratings at the start of the
+period, scored by log-loss and Brier score like elo_sweep.py, and then applied
+together with NumPy.
+
+A rating system is any object with:
+  name                      label used in results
+  init(fighters)            state (dict of arrays) for that many fighters
+  expected(state, f, o)     probability that fighters f beat opponents o (index arrays)
+  update(state, period)     apply one Period of bouts to the state
+  ratings(state)            rating per fighter on the usual 1500 scale
+and, to drive an EloEngine (and with it checkpoints, leaderboards and exports):
+  fields                    the engine's per-fighter state beyond the rating, {name: initial value}
+  rate_bout(engine, f, o, year, rating_f, rating_o, actual, method, event, stage)
+                            new ratings of fighter and opponent after one bout, given
+                            their ratings before it and the bout's multipliers
+  params()                  the system's parameters, stored in engine checkpoints
+
+EloSystem is the engine's default; both of its paths use elo_engine.elo_changes(),
+so with period='bout' it reproduces EloEngine's ratings (up to NumPy's rounding
+of the expected score). Glicko2System is Glickman's Glicko-2, which tracks each
+fighter's rating deviation and volatility instead of switching K-factors. In the
+engine every bout is a rating period of its own for the two fighters, and each
+idle year before a fighter's bout counts as a period without games.
+
+    python rating_systems.py --periods event year --rules my_rules.json
+    python elo_calculator.py --system glicko2 --full
+"""
+import argparse
+import math
+from collections import namedtuple
+import numpy as np
+from elo_engine import (INITIAL_RATING, K_NEW, K_ESTABLISHED, PROVISIONAL_MATCHES, DEFAULT_RULES, elo_changes,
+                        expected_score, match_key)
+from elo_sweep import EPSILON, encode_matches, write_results
+from match_cache import load_match_store
+from multiplier_rules import RULES_FILE, load_rules
+
+PERIODS = ('bout', 'event', 'year')
+
+# Bouts of one rating period as parallel arrays, see encode_matches
+Period = namedtuple('Period', 'fighters opponents actuals wins methods events stages')
+
+class EloSystem:
+    name = 'elo'
+    fields = {}
+
+    def __init__(self, k_new=K_NEW, k_established=K_ESTABLISHED, provisional_matches=PROVISIONAL_MATCHES,
+                 initial_rating=INITIAL_RATING, rules=DEFAULT_RULES):
+        self.k_new = k_new
+        self.k_established = k_established
+        self.provisional_matches = provisional_matches
+        self.initial_rating = initial_rating
+        # Indexed like encode_matches' method classes
+        self.method_multipliers = np.array(list(rules.method_multipliers.values()))
+        # Event index -1 (no keyword) picks the trailing 1.0
+        self.event_multipliers = np.array(list(rules.event_multipliers.values()) + [1.0])
+
+    def params(self):
+        return {'name': self.name, 'k_new': self.k_new, 'k_established': self.k_established,
+                'provisional_matches': self.provisional_matches, 'initial_rating': self.initial_rating}
+
+    def rate_bout(self, engine, fighter, opponent, year, rating_f, rating_o, actual, method_multiplier,
+                  event_multiplier, stage_multiplier):
+        match_counts = engine.match_counts
+        k_f = self.k_new if match_counts[fighter] < self.provisional_matches else self.k_established
+        k_o = self.k_new if match_counts[opponent] < self.provisional_matches else self.k_established
+        change_f, change_o = elo_changes(expected_score(rating_f, rating_o), k_f, k_o, actual,
+                                         method_multiplier, event_multiplier, stage_multiplier)
+        return rating_f + change_f, rating_o + change_o
+
+    def init(self, fighters):
+        return {'rating': np.full(fighters, self.initial_rating, dtype=float), 'matches': np.zeros(fighters, dtype=int)}
+
+    def expected(self, state, f, o):
+        ratings = state['rating']
+        return expected_score(ratings[f], ratings[o])
+
+    def update(self, state, period):
+        ratings, counts = state['rating'], state['matches']
+        f, o = period.fighters, period.opponents
+        k_f = np.where(counts[f] < self.provisional_matches, self.k_new, self.k_established)
+        k_o = np.where(counts[o] < self.provisional_matches, self.k_new, self.k_established)
+        # The winner's method and event multipliers
+        method = np.where(period.wins, self.method_multipliers[period.methods], 1.0)
+        event = np.where(period.wins, self.event_multipliers[period.events], 1.0)
+        change_f, change_o = elo_changes(self.expected(state, f, o), k_f, k_o, period.actuals, method, event, period.stages)
+        np.add.at(ratings, f, change_f)
+        np.add.at(ratings, o, change_o)
+        np.add.at(counts, f, 1)
+        np.add.at(counts, o, 1)
+
+    def ratings(self, state):
+        return state['rating']
+
+class Glicko2System:
+    name = 'glicko2'
+
+    # Glicko-2 works on (rating - 1500) / SCALE
+    SCALE = 400 / math.log(10)
+    CONVERGENCE = 1e-6
+
+    def __init__(self, tau=0.5, initial_rd=350.0, initial_volatility=0.06, initial_rating=INITIAL_RATING):
+        self.tau = tau
+        self.initial_rd = initial_rd
+        self.initial_volatility = initial_volatility
+        self.initial_rating = initial_rating
+        # Deviation on the rating scale, like deviations()
+        self.fields = {'deviation': initial_rd, 'volatility': initial_volatility}
+
+    def params(self):
+        return {'name': self.name, 'tau': self.tau, 'initial_rd': self.initial_rd,
+                'initial_volatility': self.initial_volatility, 'initial_rating': self.initial_rating}
+
+    def rate_bout(self, engine, fighter, opponent, year, rating_f, rating_o, actual, method_multiplier,
+                  event_multiplier, stage_multiplier):
+        # A one-bout period through update(), on a state holding just the two fighters
+        deviations, volatilities, last_years = engine.system_state['deviation'], engine.system_state['volatility'], engine.last_years
+        players = (fighter, opponent)
+        sigma = np.array([volatilities[p] for p in players])
+        phi = np.array([deviations[p] for p in players]) / self.SCALE
+        idle_years = np.array([year - last_years[p] - 1 if last_years[p] else 0 for p in players])
+        phi = np.minimum(np.sqrt(phi ** 2 + np.maximum(idle_years, 0) * sigma ** 2), self.initial_rd / self.SCALE)
+        state = {'mu': (np.array([rating_f, rating_o]) - self.initial_rating) / self.SCALE, 'phi': phi, 'sigma': sigma}
+        self.update(state, Period(np.array([0]), np.array([1]), np.array([float(actual)]), None, None, None, None))
+        for p, deviation, volatility in zip(players, self.deviations(state), state['sigma']):
+            deviations[p] = deviation
+            volatilities[p] = volatility
+        new_rating_f, new_rating_o = self.ratings(state).tolist()
+        return new_rating_f, new_rating_o
+
+    def init(self, fighters):
+        return {
+            'mu': np.zeros(fighters),
+            'phi': np.full(fighters, self.initial_rd / self.SCALE),
+            'sigma': np.full(fighters, self.initial_volatility),
+        }
+
+    @staticmethod
+    def g(phi):
+        return 1 / np.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+    def expected(self, state, f, o):
+        mu, phi = state['mu'], state['phi']
+        return 1 / (1 + np.exp(-self.g(np.hypot(phi[f], phi[o])) * (mu[f] - mu[o])))
+
+    def _volatility(self, phi, sigma, v, delta):
+        """New volatility by the Illinois iteration of Glickman's step 5, for many fighters at once"""
+        tau = self.tau
+        a = np.log(sigma ** 2)
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+        big = delta ** 2 > phi ** 2 + v
+        B = np.where(big, np.log(np.where(big, delta ** 2 - phi ** 2 - v, 1.0)), a - tau)
+        low = ~big & (f(B) < 0)
+        k = 1
+        while low.any():
+            k += 1
+            B = np.where(low, a - k * tau, B)
+            low &= f(B) < 0
+
+        A = a
+        f_A, f_B = f(A), f(B)
+        active = np.abs(B - A) > self.CONVERGENCE
+        while active.any():
+            with np.errstate(divide='ignore', invalid='ignore'):  # Converged entries are masked out below
+                C = A + (A - B) * f_A / (f_B - f_A)
+                f_C = f(C)
+            swap = f_C * f_B <= 0
+            A = np.where(active, np.where(swap, B, A), A)
+            f_A = np.where(active, np.where(swap, f_B, f_A / 2), f_A)
+            B = np.where(active, C, B)
+            f_B = np.where(active, f_C, f_B)
+            active &= np.abs(B - A) > self.CONVERGENCE
+        return np.exp(A / 2)
+
+    def update(self, state, period):
+        mu, phi, sigma = state['mu'], state['phi'], state['sigma']
+        n = len(mu)
+        # Every bout is a game for both sides
+        players = np.concatenate([period.fighters, period.opponents])
+        opponents = np.concatenate([period.opponents, period.fighters])
+        scores = np.concatenate([period.actuals, 1 - period.actuals])
+
+        g = self.g(phi[opponents])
+        expected = 1 / (1 + np.exp(-g * (mu[players] - mu[opponents])))
+        v_inverse = np.bincount(players, weights=g ** 2 * expected * (1 - expected), minlength=n)
+        improvement = np.bincount(players, weights=g * (scores - expected), minlength=n)
+
+        played = np.flatnonzero(v_inverse > 0)
+        v = 1 / v_inverse[played]
+        new_sigma = self._volatility(phi[played], sigma[played], v, v * improvement[played])
+        phi_star = np.sqrt(phi[played] ** 2 + new_sigma ** 2)
+        new_phi = 1 / np.sqrt(1 / phi_star ** 2 + v_inverse[played])
+
+        # Fighters who sat the period out only grow more uncertain, up to the initial deviation
+        idle_phi = np.minimum(np.sqrt(phi ** 2 + sigma ** 2), self.initial_rd / self.SCALE)
+        mu[played] += new_phi ** 2 * improvement[played]
+        phi[:] = idle_phi
+        phi[played] = new_phi
+        sigma[played] = new_sigma
+
+    def ratings(self, state):
+        return self.initial_rating + self.SCALE * state['mu']
+
+    def deviations(self, state):
+        return self.SCALE * state['phi']
+
+SYSTEMS = {'elo': EloSystem, 'glicko2': Glicko2System}
+
+def period_boundaries(matches, period):
+    """
+    Order of the encoded bouts and where each rating period starts, for the bouts
+    encode_matches keeps. Events are (Year, Competition) pairs, in order of their first bout.
+    """
+    keys = []
+    for match in sorted(matches, key=match_key):
+        if match.get('W/L', '').strip().upper() not in ('W', 'L', 'D'):
+            continue  # Skipped by encode_matches too
+        if period == 'bout':
+            keys.append(len(keys))
+        elif period == 'event':
+            keys.append((match['Year'], match.get('Competition', '').strip().lower()))
+        elif period == 'year':
+            keys.append(match['Year'])
+        else:
+            raise ValueError(f"Unknown rating period {period!r}, expected one of {', '.join(PERIODS)}")
+
+    first_seen = {}
+    for i, key in enumerate(keys):
+        first_seen.setdefault(key, i)
+    order = sorted(range(len(keys)), key=lambda i: first_seen[keys[i]])
+    starts = [i for i in range(len(order)) if i == 0 or keys[order[i]] != keys[order[i - 1]]]
+    return np.array(order, dtype=int), starts + [len(order)]
+
+def run_system(matches, system, period='year', min_year=None, rules=DEFAULT_RULES):
+    """
+    Rate matches with one system, period by period; rules decides the method, event
+    and stage of each bout (give an EloSystem the same rules).
+    Bouts before min_year still update ratings but are not scored.
+    Returns the final state, {fighter key: index into the state arrays} and a
+    result dict with log_loss, brier and bouts_scored.
+    """
+    fighter_index, fighters, opponents, actuals, wins, methods, events, stages, years = encode_matches(
+        matches, list(rules.event_multipliers), rules)
+    order, starts = period_boundaries(matches, period)
+    fighters, opponents, actuals, wins, methods, events, stages, years = (
+        np.asarray(column)[order] for column in (fighters, opponents, actuals, wins, methods, events, stages, years))
+
+    state = system.init(len(fighter_index))
+    log_loss = brier = 0.0
+    scored = 0
+    for start, end in zip(starts, starts[1:]):
+        period_bouts = Period(fighters[start:end], opponents[start:end], actuals[start:end], wins[start:end],
+                              methods[start:end], events[start:end], stages[start:end])
+        expected = system.expected(state, period_bouts.fighters, period_bouts.opponents)
+        score = years[start:end] >= min_year if min_year is not None else slice(None)
+        p = np.clip(expected[score], EPSILON, 1 - EPSILON)
+        actual = period_bouts.actuals[score]
+        log_loss -= np.sum(actual * np.log(p) + (1 - actual) * np.log(1 - p))
+        brier += np.sum((expected[score] - actual) ** 2)
+        scored += len(actual)
+        system.update(state, period_bouts)
+
+    result = {
+        'system': system.name,
+        'period': period,
+        'log_loss': log_loss / scored if scored else float('nan'),
+        'brier': brier / scored if scored else float('nan'),
+        'bouts_scored': scored,
+    }
+    return state, fighter_index, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare rating systems by predictive log-loss and Brier score')
+    parser.add_argument('--systems', nargs='+', choices=list(SYSTEMS), default=list(SYSTEMS))
+    parser.add_argument('--periods', nargs='+', choices=PERIODS, default=['bout', 'event', 'year'],
+                        help='rating periods to try (default: all)')
+    parser.add_argument('--matches', default='fighter_matches.csv')
+    parser.add_argument('--min-year', type=int, help='only score bouts from this year on')
+    parser.add_argument('--rules', default=RULES_FILE, help='method, competition and stage multiplier table (default: multiplier_rules.json)')
+    parser.add_argument('--out', default='rating_systems.csv')
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules)
+    matches = list(load_match_store(args.matches))
+    results = []
+    for name in args.systems:
+        system = EloSystem(rules=rules) if name == 'elo' else SYSTEMS[name]()
+        for period in args.periods:
+            _, _, result = run_system(matches, system, period, args.min_year, rules)
+            print(f"{name:8} per {period:5}: log-loss {result['log_loss']:.4f}, Brier {result['brier']:.4f} "
+                  f"over {result['bouts_scored']} bouts")
+            results.append(result)
+    write_results(results, args.out)
+    print(f"Results saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
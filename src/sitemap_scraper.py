@@ -1,20 +1,40 @@
+import argparse
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fetcher import USER_AGENT, FetchSettings, Fetcher, write_failure_report, read_failure_report
+from page_cache import PageCache, conditional_headers, is_fresh
+from match_table_parser import parse_fighter_page_fast
+from match_csv import MatchCsvWriter, copy_matches_except
+from crawl_ledger import CrawlLedger
+from metrics import METRICS
+
+BASE_URL = 'https://www.bjjheroes.com'
+FAILURE_REPORT = 'failed_fighter_urls.txt'
 
 # Create a session for connection pooling
 session = requests.Session()
 session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    'User-Agent': USER_AGENT
 })
 
-def get_fighter_urls_from_sitemap():
+def fighter_page_url(fighter_url, base_url=BASE_URL):
+    return f"{base_url}/bjj-fighters/{fighter_url}"
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+def get_fighter_urls_from_sitemap(base_url=BASE_URL):
     """Extract all fighter URLs from the sitemap XML"""
-    sitemap_url = 'https://www.bjjheroes.com/post-sitemap.xml'
-    fighter_urls = set()
+    return list(get_fighter_sitemap_entries(base_url))
+
+def get_fighter_sitemap_entries(base_url=BASE_URL):
+    """Map each fighter URL in the sitemap XML to its <lastmod> (None if missing)"""
+    sitemap_url = f'{base_url}/post-sitemap.xml'
+    fighter_urls = {}
     
     try:
         print(f"Fetching sitemap from: {sitemap_url}")
@@ -25,198 +45,401 @@ def get_fighter_urls_from_sitemap():
         root = ET.fromstring(response.text)
         
         # Find all URL elements in the sitemap
-        for url_elem in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-            url_text = url_elem.text
+        for entry_elem in root.iter(f'{SITEMAP_NS}url'):
+            url_text = entry_elem.findtext(f'{SITEMAP_NS}loc')
             if url_text and 'bjj-fighters/' in url_text:
                 # Extract the fighter URL part
-                fighter_url = url_text.split('bjj-fighters/')[-1]
+                fighter_url = url_text.strip().split('bjj-fighters/')[-1]
                 if fighter_url:
-                    fighter_urls.add(fighter_url)
+                    lastmod = entry_elem.findtext(f'{SITEMAP_NS}lastmod')
+                    fighter_urls[fighter_url] = lastmod.strip() if lastmod else None
                     print(f"Found fighter URL: {fighter_url}")
         
         print(f"Total fighter URLs found: {len(fighter_urls)}")
         
     except ET.ParseError as e:
         print(f"Error parsing XML sitemap: {e}")
-        return []
+        return {}
     except requests.RequestException as e:
         print(f"Error fetching sitemap: {e}")
-        return []
+        return {}
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return []
+        return {}
     
-    return list(fighter_urls)
+    return fighter_urls
 
 def get_fighter_data_from_url(fighter_url):
     """Get data for a fighter using a known URL"""
-    url_name = f"https://www.bjjheroes.com/bjj-fighters/{fighter_url}"
+    url_name = fighter_page_url(fighter_url)
     
     try:
         response = session.get(url_name, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract fighter name from the page
-        fighter_name = "Unknown"
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
-            # Try to extract name from title
-            if 'BJJ Heroes' in title_text:
-                name_part = title_text.split('BJJ Heroes')[0].strip()
-                if name_part:
-                    fighter_name = name_part
-        
-        # Find the matches table
-        matches_table = soup.find('table')
-        if not matches_table:
-            return None
-            
-        # Get table headers to understand the structure
-        headers = []
-        header_row = matches_table.find('tr')
-        if header_row:
-            headers = [th.get_text(strip=True) for th in header_row.find_all(['th', 'td'])]
-        
-        # Get all data rows
-        data_rows = matches_table.find_all('tr')[1:]  # Skip header row
-        
-        if data_rows:
-            fighter_data = {
-                'name': fighter_name,
-                'url': fighter_url,
-                'matches': []
-            }
-            
-            for row in data_rows:
-                cells = row.find_all('td')
-                if len(cells) >= len(headers):
-                    match_data = {}
-                    
-                    # Map data to headers
-                    for i, header in enumerate(headers):
-                        if i < len(cells):
-                            match_data[header] = cells[i].get_text(strip=True)
-                    
-                    if match_data:  # Only add non-empty matches
-                        fighter_data['matches'].append(match_data)
-            
-            return fighter_data if fighter_data['matches'] else None
-            
+        return parse_fighter_page(response.text, fighter_url)
     except Exception as e:
         print(f"Error processing {fighter_url}: {e}")
         return None
 
+def parse_fighter_page(html, fighter_url):
+    """Fighter name and match table from a fighter page, or None if it has no matches"""
+    return parse_fighter_page_fast(html, fighter_url)
+
+def parse_fighter_page_bs4(html, fighter_url):
+    """Reference implementation of parse_fighter_page on a full BeautifulSoup tree"""
+    soup = BeautifulSoup(html, 'html.parser')
+    # Extract fighter name from the page
+    fighter_name = "Unknown"
+    title = soup.find('title')
+    if title:
+        title_text = title.get_text()
+        # Try to extract name from title
+        if 'BJJ Heroes' in title_text:
+            name_part = title_text.split('BJJ Heroes')[0].strip()
+            if name_part:
+                fighter_name = name_part
+    
+    # Find the matches table
+    matches_table = soup.find('table')
+    if not matches_table:
+        return None
+        
+    # Get table headers to understand the structure
+    headers = []
+    header_row = matches_table.find('tr')
+    if header_row:
+        headers = [th.get_text(strip=True) for th in header_row.find_all(['th', 'td'])]
+    
+    # Get all data rows
+    data_rows = matches_table.find_all('tr')[1:]  # Skip header row
+    
+    if data_rows:
+        fighter_data = {
+            'name': fighter_name,
+            'url': fighter_url,
+            'matches': []
+        }
+        
+        for row in data_rows:
+            cells = row.find_all('td')
+            if len(cells) >= len(headers):
+                match_data = {}
+                
+                # Map data to headers
+                for i, header in enumerate(headers):
+                    if i < len(cells):
+                        match_data[header] = cells[i].get_text(strip=True)
+                
+                if match_data:  # Only add non-empty matches
+                    fighter_data['matches'].append(match_data)
+        
+        return fighter_data if fighter_data['matches'] else None
+    return None
+
 def export_to_csv(results, filename='fighter_matches.csv'):
     """Export fighter match data to CSV file"""
     if not results:
         print("No data to export")
         return
-    
-    # Sort results alphabetically by fighter name
-    results.sort(key=lambda x: x['name'].lower())
-    
-    # Get all unique headers from all matches
-    all_headers = set()
-    for fighter_data in results:
-        for match in fighter_data['matches']:
-            all_headers.update(match.keys())
-    
-    # Convert to list and add fighter info headers
-    headers = ['Fighter_Name', 'Fighter_URL'] + list(all_headers)
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        
+
+    with MatchCsvWriter(filename) as writer:
         for fighter_data in results:
-            fighter_name = fighter_data['name']
-            fighter_url = fighter_data['url']
-            
-            for match in fighter_data['matches']:
-                # Create row with fighter info and match data
-                row = {
-                    'Fighter_Name': fighter_name,
-                    'Fighter_URL': fighter_url
-                }
-                # Add match data
-                for header in all_headers:
-                    row[header] = match.get(header, '')
-                writer.writerow(row)
-    
-    print(f"Exported {sum(len(fighter['matches']) for fighter in results)} matches to {filename} (sorted alphabetically)")
+            writer.write_fighter(fighter_data)
+        writer.finalize()
 
-def main():
-    print("Starting sitemap-based fighter URL discovery...")
-    
-    # Get all fighter URLs from sitemap
-    fighter_urls = get_fighter_urls_from_sitemap()
-    
-    if not fighter_urls:
-        print("No fighter URLs found in sitemap!")
-        return
-    
-    print(f"Discovered {len(fighter_urls)} fighter URLs from sitemap")
-    
-    # Save URLs to file for reference
-    with open('fighter_urls_from_sitemap.txt', 'w') as f:
-        for url in sorted(fighter_urls):
-            f.write(url + '\n')
-    print("Saved fighter URLs to fighter_urls_from_sitemap.txt")
-    
-    # Process fighters with threading
-    max_workers = 10
+    print(f"Exported {writer.rows} matches to {filename} (sorted alphabetically)")
+
+class StageStats:
+    """Items, bytes and busy time of one pipeline stage, for throughput reporting"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0  # Time spent on each item, summed (exceeds wall time when items overlap)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, elapsed, size=0):
+        self.items += 1
+        self.bytes += size
+        self.busy += elapsed
+
+    def done(self):
+        self.finished = time.perf_counter()
+
+    def report(self):
+        wall = (self.finished or time.perf_counter()) - self.started
+        rate = self.items / wall if wall > 0 else 0.0
+        line = f"{self.name}: {self.items} pages in {wall:.2f}s ({rate:.1f} pages/s"
+        if self.bytes:
+            line += f", {self.bytes / wall / 1e6:.2f} MB/s" if wall > 0 else ""
+        line += f", {self.busy:.2f}s summed over pages)"
+        return line
+
+def timed_parse(html, fighter_url):
+    """Parse a page in a worker process and report how long it took"""
+    start = time.perf_counter()
+    fighter_data = parse_fighter_page_fast(html, fighter_url)
+    return fighter_data, time.perf_counter() - start
+
+async def crawl(fighter_urls, settings, base_url=BASE_URL, cache=None, parse_workers=None, queue_size=100,
+                on_fighter=None, on_failure=None):
+    """
+    Fetch and parse every fighter page.
+    fighter_urls is a list of fighter URLs or a dict mapping them to their sitemap <lastmod>.
+    With a PageCache, fighters whose <lastmod> is unchanged are taken from the cache without a
+    request, the rest are fetched conditionally and a 304 reuses the cached parse.
+
+    Fetching and parsing are separate stages joined by a bounded queue: the fetcher
+    keeps settings.concurrency requests in flight, and a process pool of parse_workers
+    (default: one per core; 0 parses in this process) turns pages into match rows.
+    Every finished fighter is passed to on_fighter(fighter_url, fighter_data) as soon as it is
+    ready (fighter_data is None for a page without matches) and every failed one to
+    on_failure(fighter_url, attempts, reason); without on_fighter the fighters with matches
+    are collected and returned.
+    Returns the fighters with matches and (fighter_url, attempts, reason) for every page that failed.
+    """
+    lastmods = fighter_urls if isinstance(fighter_urls, dict) else dict.fromkeys(fighter_urls)
     results = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_url = {executor.submit(get_fighter_data_from_url, fighter_url): fighter_url for fighter_url in fighter_urls}
-        
-        # Process completed tasks
+    failures = []
+
+    def emit(fighter_url, fighter_data):
+        if on_fighter is not None:
+            on_fighter(fighter_url, fighter_data)
+        elif fighter_data:
+            results.append(fighter_data)
+
+    def fail(fighter_url, attempts, reason):
+        failures.append((fighter_url, attempts, reason))
+        if on_failure is not None:
+            on_failure(fighter_url, attempts, reason)
+    stats = {'fresh': 0, 'not_modified': 0, 'fetched': 0}
+
+    cached = {}
+    to_fetch = {}
+    for fighter_url, lastmod in lastmods.items():
+        entry = cache.get(fighter_url) if cache is not None else None
+        if is_fresh(entry, lastmod) and 'parsed' in entry:
+            # Sitemap says nothing changed since we cached it
+            stats['fresh'] += 1
+            METRICS.inc('cache_hits', kind='sitemap_unchanged')
+            emit(fighter_url, entry['parsed'])
+            continue
+        cached[fighter_url] = entry
+        to_fetch[fighter_page_url(fighter_url, base_url)] = fighter_url
+    if cache is not None:
+        print(f"{stats['fresh']} fighters unchanged since the last crawl, fetching {len(to_fetch)}")
+
+    def request_headers(url):
+        return conditional_headers(cached.get(to_fetch[url]))
+
+    loop = asyncio.get_running_loop()
+    if parse_workers is None:
+        parse_workers = os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+    # Pages waiting to be parsed; a full queue makes the fetcher wait
+    queue = asyncio.Queue(maxsize=queue_size)
+    fetch_stats = StageStats('Fetch')
+    parse_stats = StageStats('Parse')
+
+    async def fetch_stage():
         completed = 0
-        for future in as_completed(future_to_url):
-            fighter_url = future_to_url[future]
-            completed += 1
-            
-            try:
-                fighter_data = future.result()
-                if fighter_data:
-                    results.append(fighter_data)
-                    
+        async with Fetcher(settings) as fetcher:
+            async for result in fetcher.fetch_all(to_fetch, headers=request_headers):
+                fighter_url = to_fetch[result.url]
+                entry = cached.get(fighter_url)
+                completed += 1
+                METRICS.add_time('page_fetch', result.elapsed)
+                METRICS.inc('http_responses', status=result.status or 'error')
+                METRICS.inc('http_retries', result.attempts - 1)
+                if result.not_modified and entry is not None:
+                    stats['not_modified'] += 1
+                    METRICS.inc('cache_hits', kind='not_modified')
+                    fetch_stats.add(result.elapsed)
+                    cache.touch(entry, lastmods[fighter_url])
+                    emit(fighter_url, entry['parsed'])
+                elif not result.ok:
+                    print(f"Error fetching {fighter_url} after {result.attempts} attempts: {result.describe_failure()}")
+                    fail(fighter_url, result.attempts, result.describe_failure())
+                    METRICS.inc('fetch_failures')
+                else:
+                    stats['fetched'] += 1
+                    METRICS.inc('pages_downloaded')
+                    fetch_stats.add(result.elapsed, len(result.text))
+                    await queue.put((fighter_url, result))
+
                 # Print progress
                 if completed % 10 == 0:
-                    print(f"Processed {completed}/{len(fighter_urls)} fighters...")
-                    
-            except Exception as e:
-                print(f"Error processing {fighter_url}: {e}")
+                    print(f"Fetched {completed}/{len(to_fetch)} fighters...")
+        fetch_stats.done()
+
+    async def parse_stage():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                fighter_url, result = item
+                try:
+                    if pool is not None:
+                        fighter_data, elapsed = await loop.run_in_executor(pool, timed_parse, result.text, fighter_url)
+                    else:
+                        fighter_data, elapsed = timed_parse(result.text, fighter_url)
+                except Exception as e:
+                    print(f"Error processing {fighter_url}: {e}")
+                    fail(fighter_url, result.attempts, f"parse error: {e}")
+                    METRICS.inc('parse_failures')
+                    continue
+                parse_stats.add(elapsed, len(result.text))
+                METRICS.add_time('parse', elapsed)
+                METRICS.inc('pages_parsed')
+                METRICS.inc('page_bytes', len(result.text))
+                if cache is not None:
+                    cache.put(fighter_url, etag=result.headers.get('ETag'),
+                              last_modified=result.headers.get('Last-Modified'),
+                              sitemap_lastmod=lastmods[fighter_url], body=result.text, parsed=fighter_data)
+                emit(fighter_url, fighter_data)
+            finally:
+                queue.task_done()
+
+    # Two parse tasks per worker keep the pool busy while results are handled
+    parsers = [asyncio.create_task(parse_stage()) for _ in range(max(1, parse_workers) * 2)]
+    try:
+        await fetch_stage()
+        for _ in parsers:
+            await queue.put(None)
+        await asyncio.gather(*parsers)
+    finally:
+        for task in parsers:
+            task.cancel()
+        if pool is not None:
+            pool.shutdown()
+    parse_stats.done()
+
+    print(fetch_stats.report())
+    print(parse_stats.report() + f" with {parse_workers or 'no'} worker processes")
+    if cache is not None:
+        print(f"Cache: {stats['fresh']} unchanged in sitemap, {stats['not_modified']} not modified, {stats['fetched']} downloaded")
+    return results, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape fighter match tables listed in the BJJ Heroes sitemap')
+    parser.add_argument('--base-url', default=BASE_URL, help='site to crawl, e.g. a local stub server (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=10, help='requests in flight at once (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=5.0, help='max requests per second to the site, 0 for no limit (default: %(default)s)')
+    parser.add_argument('--retries', type=int, default=4, help='retries on 429, 5xx and network errors (default: %(default)s)')
+    parser.add_argument('--backoff', type=float, default=1.0, help='seconds before the first retry, doubled each time (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='per request timeout in seconds (default: %(default)s)')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1,
+                        help='parser processes, 0 to parse in the crawler process (default: %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=100, help='fetched pages waiting to be parsed (default: %(default)s)')
+    parser.add_argument('--cache-dir', default='page_cache', help='conditional-request page cache (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='download and parse every page')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help=f'only crawl the fighters listed in {FAILURE_REPORT} and merge them into fighter_matches.csv')
+    parser.add_argument('--no-sort', action='store_true',
+                        help='leave fighter_matches.csv in crawl order instead of sorting it by fighter name')
+    parser.add_argument('--ledger', default='crawl_ledger.sqlite', help='crawl progress, used to resume an interrupted crawl (default: %(default)s)')
+    parser.add_argument('--restart', action='store_true', help='start a new crawl even if the last one did not finish')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='write stage timings and counters to FILE at exit: JSON, or Prometheus text if it ends in .prom')
+    args = parser.parse_args(argv)
+
+    # Page fetch and parse times are summed over pages, the other stages are wall time
+    METRICS.reset(prefix='scraper')
+    try:
+        run(args)
+    finally:
+        if args.metrics:
+            METRICS.dump(args.metrics)
+            print(f"Metrics saved to {args.metrics}")
+
+def run(args):
+    settings = FetchSettings(
+        concurrency=args.concurrency,
+        requests_per_second=args.rate,
+        max_retries=args.retries,
+        backoff_base=args.backoff,
+        timeout=args.timeout,
+    )
+
+    with CrawlLedger(args.ledger) as ledger:
+        keep_previous_csv = False
+        if args.retry_failed:
+            fighter_urls = read_failure_report(FAILURE_REPORT)
+            print(f"Retrying {len(fighter_urls)} fighters from {FAILURE_REPORT}")
+            if ledger.counts():
+                ledger.requeue(fighter_urls)
+            else:
+                # No ledger from the earlier crawl, so merge into its export instead
+                ledger.start(fighter_urls)
+                keep_previous_csv = os.path.exists('fighter_matches.csv')
+        elif ledger.unfinished() and not args.restart:
+            counts = ledger.counts()
+            print(f"Resuming the unfinished crawl in {args.ledger}: {counts.get('done', 0)} fighters done, "
+                  f"{counts.get('pending', 0)} pending, {counts.get('failed', 0)} failed")
+        else:
+            print("Starting sitemap-based fighter URL discovery...")
+
+            # Get all fighter URLs from sitemap
+            with METRICS.timer('sitemap_fetch'):
+                fighter_urls = get_fighter_sitemap_entries(args.base_url)
+
+            if not fighter_urls:
+                print("No fighter URLs found in sitemap!")
+                return
+
+            print(f"Discovered {len(fighter_urls)} fighter URLs from sitemap")
+
+            # Save URLs to file for reference
+            with open('fighter_urls_from_sitemap.txt', 'w') as f:
+                for url in sorted(fighter_urls):
+                    f.write(url + '\n')
+            print("Saved fighter URLs to fighter_urls_from_sitemap.txt")
+            ledger.start(fighter_urls)
+
+        # Every result is committed to the ledger as it arrives, so a crash loses nothing
+        cache = None if args.no_cache else PageCache(args.cache_dir)
+        with METRICS.timer('crawl'):
+            asyncio.run(crawl(ledger.pending(), settings, args.base_url, cache,
+                              parse_workers=args.parse_workers, queue_size=args.queue_size,
+                              on_fighter=ledger.record_done, on_failure=ledger.record_failed))
+
+        # Record what to retry; an empty report means the crawl is complete
+        failures = ledger.failures()
+        write_failure_report(failures, FAILURE_REPORT)
+        if failures:
+            print(f"{len(failures)} fighters failed, see {FAILURE_REPORT} (rerun with --retry-failed)")
+
+        # The export is streamed from the ledger and only replaces fighter_matches.csv once complete
+        with METRICS.timer('write'), MatchCsvWriter('fighter_matches.csv') as writer:
+            if keep_previous_csv:
+                # Keep everyone from the earlier export except the fighters being retried
+                copied = copy_matches_except('fighter_matches.csv', writer, set(fighter_urls))
+                print(f"Kept {copied} matches from the previous export")
+            for fighter_data in ledger.iter_fighters():
+                writer.write_fighter(fighter_data)
+
+            if not writer.rows:
+                writer.close()
+                os.remove(writer.part_filename)
+            else:
+                writer.finalize(sort=not args.no_sort)
+        # Every fighter is done or failed now, even with nothing to export, so the next run starts afresh
+        ledger.finish()
+        if not writer.rows:
+            print("No data to export")
+            return
+        METRICS.set('matches_exported', writer.rows)
+        METRICS.set('fighters_exported', writer.fighters)
+
+        print(f"Exported {writer.rows} matches for {writer.fighters} fighters to fighter_matches.csv"
+              + (" (sorted alphabetically)" if not args.no_sort else ""))
 
-    # Export to CSV
-    export_to_csv(results, 'fighter_matches.csv')
-    
-    # Print results
-    print(f"\nFound data for {len(results)} fighters with matches:")
-    print("=" * 80)
-    
-    printed_names = set()  # Track which names have been printed
-    
-    for fighter_data in results:
-        fighter_name = fighter_data['name']
-        
-        # Only print the name if we haven't seen it before
-        if fighter_name not in printed_names:
-            print(f"Athlete: {fighter_name} (URL: {fighter_data['url']})")
-            printed_names.add(fighter_name)
-        
-        for match in fighter_data['matches']:
-            for header, value in match.items():
-                if value:  # Only print non-empty values
-                    print(f"  {header}: {value}")
-            print("  ---")
-        print('=' * 80)
 
 if __name__ == "__main__":
     start_time = time.time()
     main()
     end_time = time.time()
-    print(f"\nTotal execution time: {end_time - start_time:.2f} seconds") 
\ No newline at end of file
+    print(f"\nTotal execution time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+Synthetic fighter_matches.csv data and fighter pages for benchmarks.
+
+generate_matches() streams rows with the fighter_matches.csv columns at any
+size: fighters have a hidden skill that decides their bouts, page owners carry
+the " |" suffix (and sometimes a nickname) the site adds, and a bout between
+two page owners appears on both pages with the result mirrored, as in the
+scraped data. render_fighter_page() lays rows out like a fighter page on the
+site, so the scraper's parser can be fed pages of any size; the pages in
+synthetic_pages/ are scraped rows of a few real fighters rendered this way
+(see render_saved_pages()), not pages recorded from the site.
+"""
+import argparse
+import csv
+import html
+import os
+import random
+from unidecode import unidecode
+from fighter_names import clean_name
+from match_csv import MATCH_COLUMNS
+
+FIRST_NAMES = ['João', 'Marcus', 'Gabriel', 'Felipe', 'Rafael', 'Lucas', 'André', 'Bruno', 'Mica', 'Tainan',
+               'Gordon', 'Craig', 'Nicholas', 'Kaynan', 'Leandro', 'Roberto', 'Ffion', 'Gabrieli', 'Ana', 'Beatriz',
+               'Mackenzie', 'Jessica', 'Tammi', 'Dominyka', 'Victor', 'César', 'Diego', 'Erich', 'Isaque', 'Kennedy',
+               'Paulo', 'Rodolfo', 'Vinícius', 'Yuri', 'Jansen', 'Levi', 'Helena', 'Luiza', 'Kendall', 'Adele']
+LAST_NAMES = ['Almeida', 'Galvão', 'Pena', 'Ribeiro', 'Mendes', 'Ryan', 'Jones', 'Meregali', 'Duarte', 'Lo',
+              'Pessanha', 'Dalpra', 'Ruotolo', 'Tonon', 'Gomes', 'Honório', 'Gracie', 'Musumeci', 'Munis', 'Simões',
+              'Guimarães', 'Vieira', 'Rocha', 'Nogueira', 'Lepri', 'Miyao', 'Santos', 'Barbosa', 'Abreu', 'Oliveira',
+              'Davies', 'Fox', 'Bernardo', 'Krikorian', 'Ferreira', 'Cruz', 'Macedo', 'Brito', 'Dern', 'Reis']
+NICKNAMES = ['Buchecha', 'Preguiça', 'Cyborg', 'Tex', 'Gabi', 'Trator', 'Bisnaga', 'Tigrão']
+COMPETITIONS = ['World Champ.', 'Pan American', 'European Open', 'Brasileiro', 'NoGi Worlds', 'World Pro',
+                'ADCC', 'ADGS RJ', 'Grand Slam RJ', 'NoGi Pan', 'American Nats', 'ADCC WC Trials', 'Spyder Invit.',
+                'Abu Dhabi KOTM', 'CJI', 'ONE FC', 'UFC Fight Pass Invit.', 'WNO', 'Polaris', 'Kakuto', 'Copa Podio']
+STAGES = ['SF', 'SF', '4F', '4F', 'F', 'F', 'R1', '8F', 'SPF', 'RR', 'R2', 'RPC', '3RD', 'QF']
+WEIGHTS = ['ABS', 'ABS', '70KG', '94KG', '76KG', '88KG', '82KG', '77KG', '85KG', '64KG', '69KG', '100KG', 'O100KG']
+METHODS = ['Referee Decision', 'Pts: 2x0', 'Choke from back', 'Armbar', 'Points', 'Pts: 0x0, Adv', 'RNC',
+           'Pts: 4x2', 'Triangle', 'N/A', 'Pts: 2x2, Adv', 'Inside heel hook', 'Kneebar', 'Bow and arrow', 'Adv']
+
+# Years span and how many bouts one event holds
+FIRST_YEAR, LAST_YEAR = 1996, 2025
+BOUTS_PER_EVENT = 40
+# Share of bouts against another page owner, which then shows up on both pages
+OWNER_OPPONENTS = 0.2
+
+def fighter_name(i):
+    """Distinct name for fighter i, growing extra surnames once the first/last combinations run out"""
+    name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+    i //= len(FIRST_NAMES) * len(LAST_NAMES)
+    while i:
+        i -= 1
+        name += f" {LAST_NAMES[i % len(LAST_NAMES)]}"
+        i //= len(LAST_NAMES)
+    return name
+
+def fighter_slug(name):
+    return '-'.join(unidecode(name).lower().split())
+
+def generate_matches(rows, seed=0, fighters=None, owners=None):
+    """
+    Yield about `rows` match rows (dicts with MATCH_COLUMNS). fighters defaults to one per
+    4 rows and page owners to one fighter in 20, close to the scraped data.
+    """
+    rng = random.Random(seed)
+    fighters = fighters or max(2, rows // 4)
+    owners = owners or max(1, fighters // 20)
+    skill = [rng.gauss(0, 1) for _ in range(fighters)]
+    names = [fighter_name(i) for i in range(fighters)]
+    page_names = {}
+    for i in range(owners):
+        first, last = names[i].split(' ', 1)
+        if rng.random() < 0.05:
+            page_names[i] = f'{first} "{rng.choice(NICKNAMES)}" {last} |'
+        else:
+            page_names[i] = f"{names[i]} |"
+
+    # Later years have more bouts, as on the site
+    years = list(range(FIRST_YEAR, LAST_YEAR + 1))
+    year_weights = [1 + (year - FIRST_YEAR) ** 2 for year in years]
+    total_weight = sum(year_weights)
+    bouts = rows / (1 + OWNER_OPPONENTS)  # Bouts between page owners take two rows
+
+    def schedule():
+        """(year, competition) of every bout, in order; the last year absorbs any remainder"""
+        for year, weight in zip(years, year_weights):
+            year_bouts = max(1, round(bouts * weight / total_weight))
+            for i in range(year_bouts):
+                if i % BOUTS_PER_EVENT == 0:
+                    competition = rng.choice(COMPETITIONS)
+                yield year, competition
+        while True:
+            competition = rng.choice(COMPETITIONS)
+            for _ in range(BOUTS_PER_EVENT):
+                yield LAST_YEAR, competition
+
+    emitted = 0
+    for bout_id, (year, competition) in enumerate(schedule(), 1):
+        if emitted >= rows:
+            return
+        owner = rng.randrange(owners)
+        opponent = rng.randrange(owners) if rng.random() < OWNER_OPPONENTS else rng.randrange(fighters)
+        if opponent == owner:
+            opponent = (opponent + 1) % fighters
+        p_win = 1 / (1 + 10 ** ((skill[opponent] - skill[owner]) * 0.8))
+        if rng.random() < 0.007:
+            result = 'D'
+        else:
+            result = 'W' if rng.random() < p_win else 'L'
+        row = {
+            'Fighter_Name': page_names[owner],
+            'Fighter_URL': fighter_slug(names[owner]),
+            'W/L': result,
+            'Opponent': names[opponent],
+            'Stage': rng.choice(STAGES),
+            'Weight': rng.choice(WEIGHTS),
+            'ID': str(bout_id),
+            'Competition': competition,
+            'Method': rng.choice(METHODS),
+            'Year': str(year),
+        }
+        yield row
+        emitted += 1
+        if opponent < owners and emitted < rows:
+            # The opponent's page lists the same bout the other way round
+            mirrored = dict(row)
+            mirrored['Fighter_Name'] = page_names[opponent]
+            mirrored['Fighter_URL'] = fighter_slug(names[opponent])
+            mirrored['Opponent'] = names[owner]
+            mirrored['W/L'] = {'W': 'L', 'L': 'W', 'D': 'D'}[result]
+            yield mirrored
+            emitted += 1
+
+def write_matches_csv(filename, rows, seed=0):
+    """Write generate_matches() rows to a CSV; returns the number of rows"""
+    written = 0
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=MATCH_COLUMNS)
+        writer.writeheader()
+        for row in generate_matches(rows, seed):
+            writer.writerow(row)
+            written += 1
+    return written
+
+PAGE_COLUMNS = ['ID', 'Opponent', 'W/L', 'Method', 'Competition', 'Weight', 'Stage', 'Year']
+
+def render_fighter_page(name, matches):
+    """HTML of a fighter page: title, some bio markup and the match table"""
+    display = name.rstrip(' |')  # The " |" only shows up in the <title>
+    out = [
+        '<!DOCTYPE html>',
+        '<html lang="en-US"><head><meta charset="UTF-8">',
+        f'<title>{html.escape(name)} BJJ Heroes - Jiu Jitsu fighter</title>',
+        '<script type="text/javascript">var _page = {"ajax": "/wp-admin/admin-ajax.php?a=1&b=2"};</script>',
+        '<style>.table td { padding: 2px; }</style>',
+        '</head><body class="single">',
+        '<div class="nav"><a href="/">Home</a> &raquo; <a href="/bjj-fighters">Fighters</a></div>',
+        f'<h1>{html.escape(display)}</h1><p>Full Name: {html.escape(display)}<br>Team: Synthetic BJJ &amp; Grappling</p>',
+        '<table class="table table-striped sort_table"><thead><tr>'
+        + ''.join(f'<th>{column}</th>' for column in PAGE_COLUMNS) + '</tr></thead><tbody>',
+    ]
+    for match in matches:
+        cells = []
+        for column in PAGE_COLUMNS:
+            value = html.escape(match.get(column, ''))
+            if column == 'Opponent':
+                # Scraped opponent names are often doubled ("Jane DoeJane Doe"); link the name once
+                opponent = clean_name(match.get(column, ''))
+                value = f'<span><a href="/bjj-fighters/{fighter_slug(opponent)}">{html.escape(opponent)}</a></span>'
+            cells.append(f'<td>{value}</td>')
+        out.append('<tr>' + ''.join(cells) + '</tr>')
+    out.append('</tbody></table>')
+    out.append('<table class="stats"><tr><td>Wins</td><td>by submission</td></tr></table>')
+    out.append('</body></html>')
+    return '\n'.join(out)
+
+def render_saved_pages(directory, matches_file='fighter_matches.csv'):
+    """Re-render every <fighter url>.html in directory from that fighter's rows in matches_file"""
+    slugs = {name[:-len('.html')] for name in os.listdir(directory) if name.endswith('.html')}
+    pages = {}
+    with open(matches_file, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            if row['Fighter_URL'] in slugs:
+                pages.setdefault(row['Fighter_URL'], []).append(row)
+    for slug, rows in pages.items():
+        with open(os.path.join(directory, slug + '.html'), 'w', encoding='utf-8') as f:
+            f.write(render_fighter_page(rows[0]['Fighter_Name'], rows) + '\n')
+    return len(pages)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic fighter_matches.csv')
+    parser.add_argument('rows', type=int, help='number of rows, e.g. 41000 or 10000000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='synthetic_matches.csv')
+    args = parser.parse_args()
+    written = write_matches_csv(args.out, args.rows, args.seed)
+    print(f"Wrote {written} rows to {args.out}")
+
+if __name__ == "__main__":
+    main()
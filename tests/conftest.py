@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts in src/ import each other as top-level modules
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
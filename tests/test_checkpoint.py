@@ -0,0 +1,61 @@
+"""Checkpoint files must restore the exact engine state, and are only rewritten when it changed."""
+import pytest
+from elo_engine import EloEngine, history_filename, match_key
+from match_store import MatchStore
+from synthetic_data import generate_matches
+
+@pytest.fixture(scope='module')
+def matches():
+    store = MatchStore()
+    for row in generate_matches(3000, seed=3):
+        store.add(dict(row, Year=int(row['Year']), ID=int(row['ID'])))
+    return sorted(store, key=match_key)
+
+def test_round_trip(matches, tmp_path):
+    filename = str(tmp_path / 'elo_state.json')
+    engine = EloEngine()
+    engine.update(matches)
+    assert engine.save_checkpoint(filename)
+
+    restored = EloEngine()
+    assert restored.load_checkpoint(filename)
+    assert restored.snapshot() == engine.snapshot()
+    assert not restored.update(matches)
+    assert restored.top(10) == engine.top(10)
+
+def test_unchanged_state_is_not_rewritten(matches, tmp_path):
+    filename = str(tmp_path / 'elo_state.json')
+    half = len(matches) // 2
+    engine = EloEngine()
+    engine.update(matches[:half])
+    assert engine.save_checkpoint(filename)
+    assert not engine.save_checkpoint(filename)
+
+    restored = EloEngine()
+    restored.load_checkpoint(filename)
+    restored.update(matches[:half])
+    assert not restored.save_checkpoint(filename)
+    restored.update(matches)
+    assert restored.save_checkpoint(filename)
+
+    # A different file, or a full replay, is written even with the same rows
+    assert restored.save_checkpoint(str(tmp_path / 'other.json'))
+    flipped = {'W': 'L', 'L': 'W', 'D': 'W'}
+    edited = [dict(matches[0], **{'W/L': flipped[matches[0]['W/L']]})] + matches[1:]
+    assert restored.update(edited)
+    assert restored.save_checkpoint(filename)
+
+def test_mismatched_history_is_rejected(matches, tmp_path):
+    filename = str(tmp_path / 'elo_state.json')
+    engine = EloEngine()
+    engine.update(matches)
+    engine.save_checkpoint(filename)
+    with open(history_filename(filename), 'r+b') as f:
+        f.seek(100)
+        byte = f.read(1)
+        f.seek(100)
+        f.write(bytes([byte[0] ^ 1]))
+
+    restored = EloEngine()
+    assert not restored.load_checkpoint(filename)
+    assert restored.last_key is None
@@ -0,0 +1,27 @@
+"""The in-memory per-fighter index must list the same rows as a scan of the history."""
+import random
+from history_store import RatingHistory
+
+def scan(history, fighter):
+    return [row for row, f in enumerate(history.fighters) if f == fighter]
+
+def test_rows_for_follows_appends():
+    rng = random.Random(5)
+    history = RatingHistory()
+    for batch in range(5):
+        for _ in range(200):
+            history.append(rng.randrange(30), 2000 + batch, rng.randrange(10 ** 6), rng.uniform(1300, 1900))
+        for fighter in range(31):
+            assert history.rows_for(fighter) == scan(history, fighter)
+    assert sorted(history.fighter_rows()) == sorted(set(history.fighters))
+
+def test_copies_have_their_own_index():
+    history = RatingHistory()
+    for row in range(100):
+        history.append(row % 7, 2020, row, 1500.0)
+    history.rows_for(0)
+    head = history.head(40)
+    assert head.rows_for(3) == scan(head, 3)
+    restored = RatingHistory.from_lists(history.to_lists())
+    assert restored.rows_for(6) == scan(history, 6)
+    assert history.rows_for(5) == scan(history, 5)
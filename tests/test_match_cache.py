@@ -0,0 +1,66 @@
+"""Rows from the match cache must rate, sweep and split exactly like rows read from the CSV."""
+import csv
+import pickle
+import pytest
+from elo_engine import EloEngine, match_key
+from elo_sweep import default_config, encode_matches, event_keywords
+from match_cache import CachedMatch, load_match_store
+from match_store import read_match_store
+from synthetic_data import MATCH_COLUMNS, generate_matches
+
+@pytest.fixture(scope='module')
+def csv_file(tmp_path_factory):
+    """Synthetic bouts with the case and spacing noise of scraped pages"""
+    filename = str(tmp_path_factory.mktemp('cache') / 'fighter_matches.csv')
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=MATCH_COLUMNS)
+        writer.writeheader()
+        for i, row in enumerate(generate_matches(4000, seed=7)):
+            if i % 3 == 0:
+                row = dict(row, Method=f" {row['Method'].upper()}", Competition=row['Competition'].upper() + ' ')
+            if i % 5 == 0:
+                row = dict(row, **{'W/L': f" {row['W/L'].lower()}", 'Weight': row['Weight'].lower(),
+                                   'Stage': row['Stage'].lower()})
+            writer.writerow(row)
+    return filename
+
+@pytest.fixture(scope='module')
+def stores(csv_file):
+    load_match_store(csv_file)  # Build the cache
+    return load_match_store(csv_file), read_match_store(csv_file)
+
+def test_rows_are_unchanged(stores):
+    cached, read = stores
+    assert cached.matches == read.matches
+    assert cached.conflicts == read.conflicts
+    row = next(iter(cached))
+    assert isinstance(row, CachedMatch)
+    copy = pickle.loads(pickle.dumps(row))
+    assert copy == row and copy.codes == row.codes and copy.tables == row.tables
+
+@pytest.mark.parametrize('split', [None, 'Weight', lambda match: match['Weight']], ids=['none', 'column', 'callable'])
+def test_engine_matches_csv_rows(stores, split):
+    cached, read = stores
+    engines = []
+    for store in stores:
+        engine = EloEngine(leaderboard_split=split)
+        engine.update(list(store))
+        engines.append(engine)
+    assert engines[0].snapshot() == engines[1].snapshot()
+    assert engines[0].year_end.year_ratings == engines[1].year_end.year_ratings
+
+def test_mixed_rows(stores):
+    """Plain dicts (e.g. edited rows) among cached ones"""
+    cached, read = stores
+    rows = sorted(cached, key=match_key)
+    mixed = [dict(row) if i % 2 else row for i, row in enumerate(rows)]
+    engine = EloEngine()
+    engine.update(mixed)
+    expected = EloEngine()
+    expected.update(list(read))
+    assert engine.snapshot() == expected.snapshot()
+
+def test_sweep_encoding_matches_csv_rows(stores):
+    cached, read = stores
+    keywords = event_keywords([default_config()])
+    assert encode_matches(cached, keywords) == encode_matches(read, keywords)
@@ -0,0 +1,63 @@
+"""The fast page parser must return exactly what the BeautifulSoup parser returns."""
+import os
+import random
+import pytest
+from conftest import SRC_DIR
+from match_table_parser import iter_saved_pages, parse_fighter_page_fast
+from sitemap_scraper import parse_fighter_page_bs4
+
+# Scraped rows re-rendered in the site's layout (synthetic_data.render_saved_pages), not recorded pages;
+# MALFORMED and the random soups below cover markup the renderer never produces
+FIXTURES = sorted(iter_saved_pages(os.path.join(SRC_DIR, 'synthetic_pages')))
+
+HEADER = '<title>Jane Doe BJJ Heroes</title><table><tr><th>A</th><th>B</th></tr>'
+
+MALFORMED = {
+    'unclosed_cells': HEADER + '<tr><td>1<td>2</tr><tr><td>3</td><td>4</td></tr></table>',
+    'unclosed_rows': HEADER + '<tr><td>1</td><td>2</td><tr><td>3</td><td>4</td></table>',
+    'unclosed_table': HEADER + '<tr><td>1</td><td>2</td></tr>',
+    'stray_end_tag_in_cell': '<div>' + HEADER + '<tr><td>x</div>y</td><td>z</td></tr></table></div>',
+    'unmatched_end_tag_in_cell': HEADER + '<tr><td>x</span>y</td><td>z</td></tr></table>',
+    'end_tag_closing_paragraph': '<p>' + HEADER + '<tr><td>x</p>y<p>z</td><td>w</td></tr></table>',
+    'self_closing_cell': HEADER + '<tr><td/><td>2</td></tr></table>',
+    'void_elements': HEADER + '<tr><td>x<br>y</br>z</td><td><img src="a">w</img></td></tr></table>',
+    'nested_table': HEADER + '<tr><td>1</td><td><table><tr><td>n</td></tr></table></td></tr></table>',
+    'nested_row': HEADER + '<tr><td>1</td><td>2<tr><td>3</td><td>4</td></tr></td></tr></table>',
+    'skipped_text': HEADER + '<tr><td>x<script>s</script><rt>r</rt>y</td><td><template>t</template>z</td></tr></table>',
+    'cdata_in_template': HEADER + '<tr><td><template><![CDATA[c]]></template></td><td>z</td></tr></table>',
+    'entities': HEADER + '<tr><td>a &amp; b&nbsp;&#65;</td><td>&bogus;</td></tr></table>',
+    'unclosed_title': '<title>Jane Doe BJJ Heroes<table><tr><th>A</th></tr><tr><td>x</td></tr></table>',
+    'no_table': '<title>Jane Doe BJJ Heroes</title><p>No matches yet</p>',
+}
+
+@pytest.mark.parametrize('url, html', FIXTURES, ids=[os.path.basename(url) for url, _ in FIXTURES])
+def test_fixture_pages(url, html):
+    expected = parse_fighter_page_bs4(html, url)
+    assert expected is not None
+    assert parse_fighter_page_fast(html, url) == expected
+
+@pytest.mark.parametrize('html', MALFORMED.values(), ids=MALFORMED.keys())
+def test_malformed_pages(html):
+    assert parse_fighter_page_fast(html, 'u') == parse_fighter_page_bs4(html, 'u')
+
+def _tag_soup(rng):
+    tags = ['table', 'tr', 'td', 'th', 'div', 'p', 'b', 'title', 'script', 'template', 'rt', 'br', 'img']
+    pieces = []
+    for _ in range(rng.randint(5, 40)):
+        tag = rng.choice(tags)
+        kind = rng.random()
+        if kind < 0.45:
+            pieces.append(f'<{tag}>')
+        elif kind < 0.75:
+            pieces.append(f'</{tag}>')
+        elif kind < 0.8:
+            pieces.append(f'<{tag}/>')
+        else:
+            pieces.append(rng.choice(['x', ' y ', 'BJJ Heroes', '&amp;', '<!-- c -->', '<![CDATA[c]]>']))
+    return ''.join(pieces)
+
+def test_random_tag_soup():
+    rng = random.Random(0)
+    for _ in range(2000):
+        html = _tag_soup(rng)
+        assert parse_fighter_page_fast(html, 'u') == parse_fighter_page_bs4(html, 'u'), html
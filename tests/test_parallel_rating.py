@@ -0,0 +1,46 @@
+"""Rating fighter components or divisions in a process pool must give exactly the serial result."""
+import pytest
+from elo_engine import EloEngine, match_key
+from match_store import MatchStore
+from parallel_rating import fighter_components, pack_components, rate_divisions
+from rating_systems import Glicko2System
+from synthetic_data import generate_matches
+
+CIRCUITS = ['North', 'South', 'East']
+
+@pytest.fixture(scope='module')
+def matches():
+    """Bouts of several circuits whose fighters never meet, so each is its own component"""
+    store = MatchStore()
+    for c, circuit in enumerate(CIRCUITS):
+        for row in generate_matches(3000, seed=c):
+            store.add(dict(row, Fighter_Name=f"{circuit} {row['Fighter_Name']}", Opponent=f"{circuit} {row['Opponent']}",
+                           Year=int(row['Year']), ID=c * 1000000 + int(row['ID'])))
+    return sorted(store, key=match_key)
+
+def test_circuits_are_separate_components(matches):
+    components = fighter_components(matches)
+    assert len(components) >= len(CIRCUITS)
+    assert sorted(i for component in components for i in component) == list(range(len(matches)))
+    assert len(pack_components(components, 2)) == 2
+
+@pytest.mark.parametrize('workers', [2, 3])
+@pytest.mark.parametrize('options', [{}, {'decay_rate': 0.05}, {'system': Glicko2System()}],
+                         ids=['elo', 'decay', 'glicko2'])
+def test_components_match_serial(matches, workers, options):
+    serial = EloEngine(**options)
+    serial.update(matches)
+    parallel = EloEngine(**options)
+    parallel.update(matches, workers=workers)
+    assert parallel.snapshot() == serial.snapshot()
+    assert parallel.processed == serial.processed
+    assert parallel.top(10) == serial.top(10)
+    for when in (2005, 2016, match_key(matches[len(matches) // 2])):
+        assert parallel.snapshot(as_of=when) == serial.snapshot(as_of=when)
+
+def test_divisions_match_serial(matches):
+    parallel = rate_divisions(matches, 'Weight', workers=2)
+    serial = rate_divisions(matches, 'Weight', workers=1)
+    assert list(parallel) == list(serial)
+    for division in serial:
+        assert parallel[division].snapshot() == serial[division].snapshot()